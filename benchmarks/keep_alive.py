@@ -0,0 +1,98 @@
+"""Compare requests per second with and without HTTP keep-alive.
+
+Run with ``python benchmarks/keep_alive.py``. A thread pool server is started
+in-process on a free port against a synthetic database, then every client
+thread issues ``--requests`` GET requests, either opening a new connection
+for each one (``Connection: close``) or reusing a single persistent one.
+"""
+
+import sys
+import tempfile
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.client import HTTPConnection
+from pathlib import Path
+from threading import Thread
+from time import perf_counter
+from typing import Any
+
+from query_count import seed
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.db.pool import pool
+from currency_exchange.servers import RequestHandler, ThreadPoolHTTPServer
+
+RATES_COUNT = 100
+
+
+class QuietRequestHandler(RequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def run_client(port: int, path: str, requests: int, keep_alive: bool) -> None:
+    conn = HTTPConnection('127.0.0.1', port)
+    headers = {} if keep_alive else {'Connection': 'close'}
+    for _ in range(requests):
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f'GET {path} returned {response.status}')
+        if not keep_alive:
+            conn.close()
+    conn.close()
+
+
+def measure(
+    port: int, path: str, clients: int, requests: int, keep_alive: bool
+) -> float:
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        futures = [
+            executor.submit(run_client, port, path, requests, keep_alive)
+            for _ in range(clients)
+        ]
+        for future in futures:
+            future.result()
+    return clients * requests / (perf_counter() - started)
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='/currency/AAB')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = Path(workdir) / 'rates.sqlite'
+        seed(db_path, RATES_COUNT)
+        pool.close_all()
+        pool.db_path = db_path
+
+        httpd = ThreadPoolHTTPServer(
+            ('127.0.0.1', 0),
+            partial(QuietRequestHandler, context=AppContext()),
+            args.clients,
+        )
+        Thread(target=httpd.serve_forever, daemon=True).start()
+        port = httpd.server_address[1]
+        try:
+            # Warm up the rate book and the response cache.
+            run_client(port, args.path, 10, keep_alive=True)
+            print(f'{"connection":>12} {"req/s":>10}')
+            for keep_alive in (False, True):
+                rps = measure(port, args.path, args.clients, args.requests, keep_alive)
+                label = 'keep-alive' if keep_alive else 'close'
+                print(f'{label:>12} {rps:>10.0f}')
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+            pool.close_all()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,492 @@
+"""Load-test every route of the HTTP API and save the results as JSON.
+
+Run with ``python benchmarks/load_test.py``. A synthetic database is seeded
+(by default 150 currencies with the full matrix of 22350 pairs), the server is
+started through ``start_server`` in a subprocess (or in a thread with
+``--in-process``), and each route is driven in turn by ``--clients`` threads
+over keep-alive connections. For every route the throughput, p50/p95/p99
+latency and the SQLite statements per request are reported; the statements
+are counted afterwards by replaying a few requests through the controller.
+
+``--output`` saves the results, and ``--compare`` prints the change against
+a file saved earlier, e.g. on another commit.
+"""
+
+import json
+import os
+import platform
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import SUPPRESS, ArgumentParser, Namespace
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from email.message import Message
+from http.client import HTTPConnection, RemoteDisconnected
+from itertools import count, product
+from pathlib import Path
+from statistics import quantiles
+from string import ascii_uppercase
+from threading import Thread
+from time import perf_counter
+from typing import Any
+from urllib.parse import urlencode
+
+from keep_alive import QuietRequestHandler
+from query_count import seed
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import (
+    INSERT_INTO_CURRENCIES_SQL,
+    SERVER_MODE_SINGLE,
+    SERVER_MODE_THREADED,
+    SERVER_MODES,
+)
+from currency_exchange.db.pool import pool
+from currency_exchange.main import start_server
+from currency_exchange.mvc_layers.controller import Controller, Request
+
+CODES = [''.join(letters) for letters in product(ascii_uppercase, repeat=3)]
+BATCH_ITEMS = 100
+QUERY_SAMPLES = 20
+WARMUP_REQUESTS = 20
+STARTUP_TIMEOUT = 30.0
+
+HttpRequest = tuple[str, bytes | None, dict[str, str]]
+
+
+@dataclass
+class Route:
+    name: str
+    method: str
+    status: int
+    make_request: Callable[[int], HttpRequest]
+
+    def __post_init__(self) -> None:
+        # Request numbers go on across the load and the query count, so every
+        # write gets a currency or pair that was not used before.
+        self.numbers = count()
+
+    def next_request(self) -> HttpRequest:
+        return self.make_request(next(self.numbers))
+
+
+@dataclass
+class RouteResult:
+    method: str
+    path: str
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    queries_per_request: float
+
+
+def form(fields: dict[str, str]) -> tuple[bytes, dict[str, str]]:
+    return urlencode(fields).encode(), {
+        'Content-Type': 'application/x-www-form-urlencoded'
+    }
+
+
+def make_routes(
+    currencies: list[str], spares: list[str], pairs: list[tuple[str, str]]
+) -> list[Route]:
+    created = CODES[len(currencies) + len(spares) :]
+
+    def pair(number: int) -> tuple[str, str]:
+        return pairs[number * 7919 % len(pairs)]
+
+    def create_currency(number: int) -> HttpRequest:
+        code = created[number]
+        return '/currencies', *form(
+            {'name': f'Bench {code}', 'code': code, 'sign': '$'}
+        )
+
+    def create_rate(number: int) -> HttpRequest:
+        # Pairs a spare currency (seeded without rates) with one that has
+        # rates, so the pair is new even when the seeded matrix is full.
+        base = spares[number // len(currencies)]
+        target = currencies[number % len(currencies)]
+        return '/exchangeRates', *form(
+            {
+                'baseCurrencyCode': base,
+                'targetCurrencyCode': target,
+                'rate': f'{1 + number % 100 / 10}',
+            }
+        )
+
+    def update_rate(number: int) -> HttpRequest:
+        base, target = pair(number)
+        return f'/exchangeRate/{base}{target}', *form(
+            {'rate': f'{1 + number % 100 / 10}'}
+        )
+
+    def exchange_batch(number: int) -> HttpRequest:
+        items = [
+            {'from': base, 'to': target, 'amount': 100}
+            for base, target in map(pair, range(number, number + BATCH_ITEMS))
+        ]
+        return (
+            '/exchange/batch',
+            json.dumps(items).encode(),
+            {'Content-Type': 'application/json'},
+        )
+
+    def import_rates(number: int) -> HttpRequest:
+        items = [
+            {'baseCurrencyCode': base, 'targetCurrencyCode': target, 'rate': 2}
+            for base, target in map(pair, range(number, number + BATCH_ITEMS))
+        ]
+        return (
+            '/exchangeRates/bulk',
+            json.dumps(items).encode(),
+            {'Content-Type': 'application/json'},
+        )
+
+    def currency(number: int) -> str:
+        return currencies[number % len(currencies)]
+
+    def get(path: Callable[[int], str]) -> Callable[[int], HttpRequest]:
+        return lambda number: (path(number), None, {})
+
+    return [
+        Route('currencies', 'GET', 200, get(lambda _: '/currencies')),
+        Route('currency', 'GET', 200, get(lambda n: f'/currency/{currency(n)}')),
+        Route('rates', 'GET', 200, get(lambda _: '/exchangeRates')),
+        Route(
+            'rates-page',
+            'GET',
+            200,
+            get(lambda n: f'/exchangeRates?limit=100&cursor={n * 7919 % len(pairs)}'),
+        ),
+        Route(
+            'rates-by-base',
+            'GET',
+            200,
+            get(lambda n: f'/exchangeRates?base={currency(n)}&limit=100'),
+        ),
+        Route('rate', 'GET', 200, get(lambda n: '/exchangeRate/{}{}'.format(*pair(n)))),
+        Route(
+            'exchange',
+            'GET',
+            200,
+            get(lambda n: '/exchange?from={}&to={}&amount=100'.format(*pair(n))),
+        ),
+        Route(
+            'exchange-all',
+            'GET',
+            200,
+            get(lambda n: f'/exchange/all?from={currency(n)}&amount=100'),
+        ),
+        Route('exchange-batch', 'POST', 200, exchange_batch),
+        Route('create-currency', 'POST', 201, create_currency),
+        Route('create-rate', 'POST', 201, create_rate),
+        Route('update-rate', 'PATCH', 200, update_rate),
+        Route('put-rate', 'PUT', 200, update_rate),
+        Route('import-rates', 'POST', 200, import_rates),
+    ]
+
+
+def seed_database(
+    db_path: Path, rates_count: int, new_rates_count: int
+) -> tuple[list[str], list[str], list[tuple[str, str]]]:
+    # Besides the seeded matrix, adds enough spare currencies without rates
+    # for new_rates_count new pairs.
+    seed(db_path, rates_count)
+    with sqlite3.connect(db_path) as conn:
+        codes = dict(conn.execute('SELECT ID, Code FROM Currencies'))
+        pairs = [
+            (codes[base_id], codes[target_id])
+            for base_id, target_id in conn.execute(
+                'SELECT BaseCurrencyId, TargetCurrencyId FROM ExchangeRates'
+            )
+        ]
+        currencies = list(codes.values())
+        spares = CODES[
+            len(currencies) : len(currencies) + new_rates_count // len(currencies) + 1
+        ]
+        conn.executemany(
+            INSERT_INTO_CURRENCIES_SQL,
+            ((code, f'Spare {code}', '$') for code in spares),
+        )
+    conn.close()
+    return currencies, spares, pairs
+
+
+def wait_for_port(port: int) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f'Server did not start on port {port}')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_client(port: int, route: Route, requests: int) -> tuple[list[float], int]:
+    latencies = []
+    errors = 0
+    conn = HTTPConnection('127.0.0.1', port)
+    for _ in range(requests):
+        path, body, headers = route.next_request()
+        started = perf_counter()
+        try:
+            conn.request(route.method, path, body=body, headers=headers)
+            response = conn.getresponse()
+        except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            # A serial server gives up an idle keep-alive connection when other
+            # clients are waiting; the request was not read, so send it again.
+            conn.close()
+            conn.request(route.method, path, body=body, headers=headers)
+            response = conn.getresponse()
+        response.read()
+        latencies.append(perf_counter() - started)
+        if response.status != route.status:
+            errors += 1
+        if response.will_close:
+            conn.close()
+    conn.close()
+    return latencies, errors
+
+
+def load(port: int, route: Route, clients: int, requests: int) -> RouteResult:
+    # Reads are measured warm: the first one loads the rate book and fills
+    # the response cache, which is not what a steady load sees.
+    if route.method == 'GET':
+        run_client(port, route, WARMUP_REQUESTS)
+    per_client = [
+        requests // clients + (i < requests % clients) for i in range(clients)
+    ]
+    started = perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        outcomes = list(executor.map(lambda n: run_client(port, route, n), per_client))
+    elapsed = perf_counter() - started
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+    cuts = quantiles(latencies, n=100, method='inclusive')
+    return RouteResult(
+        route.method,
+        route.make_request(0)[0].split('?')[0],
+        len(latencies),
+        sum(outcome[1] for outcome in outcomes),
+        len(latencies) / elapsed,
+        cuts[49] * 1000,
+        cuts[94] * 1000,
+        cuts[98] * 1000,
+        0.0,
+    )
+
+
+def count_queries(route: Route, context: AppContext) -> float:
+    statements: list[str] = []
+    conn = pool.connection()
+    conn.set_trace_callback(statements.append)
+    try:
+        for _ in range(QUERY_SAMPLES):
+            path, body, headers = route.next_request()
+            message = Message()
+            for name, value in headers.items():
+                message[name] = value
+            request = Request(route.method, path, message, body or b'')
+            Controller(request, context).handle()
+    finally:
+        conn.set_trace_callback(None)
+    return len(statements) / QUERY_SAMPLES
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def serve(args: Namespace) -> None:
+    # Server role of the subprocess: the database path cannot be passed to
+    # start_server, so it is set on the pool before the server starts.
+    pool.db_path = Path(args.serve_db)
+    start_server(
+        '127.0.0.1',
+        args.port,
+        handler_class=QuietRequestHandler,
+        mode=args.mode,
+        workers=args.workers,
+    )
+
+
+def start(args: Namespace, db_path: Path, port: int) -> subprocess.Popen[bytes] | None:
+    if args.in_process:
+        pool.db_path = db_path
+        Thread(
+            target=start_server,
+            args=('127.0.0.1', port),
+            kwargs={
+                'handler_class': QuietRequestHandler,
+                'mode': args.mode,
+                'workers': args.workers,
+            },
+            daemon=True,
+        ).start()
+        return None
+
+    command = [
+        sys.executable,
+        __file__,
+        '--serve-db',
+        str(db_path),
+        '--port',
+        str(port),
+        '--mode',
+        args.mode,
+    ]
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    return subprocess.Popen(command, stderr=subprocess.DEVNULL)  # noqa: S603
+
+
+def stop(server: subprocess.Popen[bytes] | None) -> None:
+    if server is not None:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def compare(results: dict[str, Any], baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text())
+    print(f'\nagainst {baseline_path} ({baseline["meta"].get("commit")})')
+    print(f'{"route":<16} {"req/s":>10} {"change":>8} {"p95 ms":>10} {"change":>8}')
+    for name, result in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            continue
+        rps_change = (result['rps'] / before['rps'] - 1) * 100
+        p95_change = (result['p95_ms'] / before['p95_ms'] - 1) * 100
+        print(
+            f'{name:<16} {result["rps"]:>10.0f} {rps_change:>+7.1f}%'
+            f' {result["p95_ms"]:>10.2f} {p95_change:>+7.1f}%'
+        )
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--currencies', type=int, default=150)
+    parser.add_argument(
+        '--rates',
+        type=int,
+        help='number of pairs; currencies are added until they fit '
+        '(default: the full matrix of --currencies)',
+    )
+    parser.add_argument('--mode', choices=SERVER_MODES, default=SERVER_MODE_THREADED)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=1000, help='per route')
+    parser.add_argument('--routes', nargs='+', help='route names to run')
+    parser.add_argument('--in-process', action='store_true')
+    parser.add_argument('--output', type=Path)
+    parser.add_argument('--compare', type=Path)
+    parser.add_argument('--serve-db', help=SUPPRESS)
+    parser.add_argument('--port', type=int, help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_db:
+        serve(args)
+        return 0
+    if args.in_process and args.mode not in (SERVER_MODE_SINGLE, SERVER_MODE_THREADED):
+        parser.error('--in-process runs only the single and threaded modes')
+
+    rates_count = args.rates or args.currencies * (args.currencies - 1)
+    results: dict[str, Any] = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'cpus': os.cpu_count(),
+            'currencies': args.currencies,
+            'rates': rates_count,
+            'mode': args.mode,
+            'workers': args.workers,
+            'clients': args.clients,
+            'requests': args.requests,
+            'in_process': args.in_process,
+        },
+        'routes': {},
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = Path(workdir) / 'load.sqlite'
+        currencies, spares, pairs = seed_database(
+            db_path, rates_count, args.requests + 2 * QUERY_SAMPLES
+        )
+        results['meta']['currencies'] = len(currencies)
+        routes = [
+            route
+            for route in make_routes(currencies, spares, pairs)
+            if args.routes is None or route.name in args.routes
+        ]
+
+        port = free_port()
+        server = start(args, db_path, port)
+        try:
+            wait_for_port(port)
+            print(
+                f'{"route":<16} {"req/s":>10} {"p50 ms":>9} {"p95 ms":>9}'
+                f' {"p99 ms":>9} {"errors":>7}'
+            )
+            route_results = {}
+            for route in routes:
+                result = load(port, route, args.clients, args.requests)
+                route_results[route.name] = result
+                print(
+                    f'{route.name:<16} {result.rps:>10.0f} {result.p50_ms:>9.2f}'
+                    f' {result.p95_ms:>9.2f} {result.p99_ms:>9.2f}'
+                    f' {result.errors:>7}'
+                )
+        finally:
+            stop(server)
+
+        # Replayed with the server stopped, so that only these requests touch
+        # the database and the rate book of this process.
+        pool.close_all()
+        pool.db_path = db_path
+        context = AppContext()
+        print(f'\n{"route":<16} {"queries/request":>16}')
+        for route in routes:
+            count_queries(route, context)  # warms the rate book of this process
+            result = route_results[route.name]
+            result.queries_per_request = count_queries(route, context)
+            print(f'{route.name:<16} {result.queries_per_request:>16.2f}')
+            results['routes'][route.name] = asdict(result)
+        context.close()
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2) + '\n')
+        print(f'\nsaved to {args.output}')
+    if args.compare is not None:
+        compare(results, args.compare)
+    return 1 if any(r['errors'] for r in results['routes'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
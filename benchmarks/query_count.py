@@ -0,0 +1,106 @@
+"""Track SQLite statements issued by Service.get_rates as the rate book grows.
+
+Run with ``python benchmarks/query_count.py``. Each size is measured cold (the
+in-memory rate book is empty and has to be loaded) and warm. The exit code is
+non-zero when a cold call issues more than ``--max-queries`` statements, so
+the script can be used as a regression gate.
+"""
+
+import sys
+import tempfile
+from argparse import ArgumentParser
+from itertools import product
+from pathlib import Path
+from sqlite3 import connect
+from string import ascii_uppercase
+from time import perf_counter
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import (
+    CREATE_CURRENCIES_TABLE_SQL,
+    CREATE_EXCHANGE_RATES_TABLE_SQL,
+    CREATE_UNIQUE_INDEX_CURRENCIES_SQL,
+    CREATE_UNIQUE_INDEX_EXCHANGE_RATES_SQL,
+    INSERT_INTO_CURRENCIES_SQL,
+    INSERT_INTO_EXCHANGE_RATES_SQL,
+)
+from currency_exchange.db.create_db import migrate_db
+from currency_exchange.db.pool import pool
+from currency_exchange.mvc_layers.service import Service
+
+DEFAULT_SIZES = (10, 100, 500, 1000, 2000)
+
+
+def seed(db_path: Path, rates_count: int) -> None:
+    codes = [''.join(letters) for letters in product(ascii_uppercase, repeat=3)]
+    currencies_count = 2
+    while currencies_count * (currencies_count - 1) < rates_count:
+        currencies_count += 1
+
+    with connect(str(db_path)) as conn:
+        conn.execute(CREATE_CURRENCIES_TABLE_SQL)
+        conn.execute(CREATE_UNIQUE_INDEX_CURRENCIES_SQL)
+        conn.execute(CREATE_EXCHANGE_RATES_TABLE_SQL)
+        conn.execute(CREATE_UNIQUE_INDEX_EXCHANGE_RATES_SQL)
+        conn.executemany(
+            INSERT_INTO_CURRENCIES_SQL,
+            ((code, f'Currency {code}', '$') for code in codes[:currencies_count]),
+        )
+        pairs = (
+            (base, target)
+            for base in range(1, currencies_count + 1)
+            for target in range(1, currencies_count + 1)
+            if base != target
+        )
+        conn.executemany(
+            INSERT_INTO_EXCHANGE_RATES_SQL,
+            (
+                (base, target, f'{base / target:.6f}')
+                for _, (base, target) in zip(range(rates_count), pairs, strict=False)
+            ),
+        )
+    conn.close()
+    migrate_db(db_path)
+
+
+def measure(service: Service, rates_count: int) -> tuple[int, float]:
+    statements: list[str] = []
+    pool.connection().set_trace_callback(statements.append)
+    started = perf_counter()
+    rates = service.get_rates()
+    elapsed = perf_counter() - started
+    pool.connection().set_trace_callback(None)
+
+    assert len(rates) == rates_count  # noqa: S101
+    return len(statements), elapsed
+
+
+def main() -> int:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--max-queries', type=int, default=3)
+    args = parser.parse_args()
+
+    failed = False
+    print(f'{"rates":>8} {"cold q":>8} {"cold ms":>10} {"warm q":>8} {"warm ms":>10}')
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            db_path = Path(workdir) / f'rates_{size}.sqlite'
+            seed(db_path, size)
+            pool.close_all()
+            pool.db_path = db_path
+            service = AppContext().service
+
+            cold_queries, cold_elapsed = measure(service, size)
+            warm_queries, warm_elapsed = measure(service, size)
+            failed = failed or cold_queries > args.max_queries
+            print(
+                f'{size:>8} {cold_queries:>8} {cold_elapsed * 1000:>10.2f}'
+                f' {warm_queries:>8} {warm_elapsed * 1000:>10.2f}'
+            )
+        pool.close_all()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
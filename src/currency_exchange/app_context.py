@@ -0,0 +1,67 @@
+from sqlite3 import OperationalError
+
+from loguru import logger
+
+from currency_exchange.constants import (
+    DEFAULT_WRITE_BEHIND_MAX_PENDING,
+    ENV_WRITE_BEHIND_MAX_PENDING,
+    ENV_WRITE_BEHIND_MS,
+)
+from currency_exchange.db.create_db import migrate_db
+from currency_exchange.db.pool import pool
+from currency_exchange.exceptions import NoDataBaseConnectionError
+from currency_exchange.mvc_layers.rate_book import RateBook
+from currency_exchange.mvc_layers.repository import Repository
+from currency_exchange.mvc_layers.response_cache import ResponseCache
+from currency_exchange.mvc_layers.service import Service
+from currency_exchange.mvc_layers.write_behind import RateWriter
+from currency_exchange.profiling import profiler_from_env
+from currency_exchange.settings import env_setting, non_negative_int, positive_int
+from currency_exchange.tracing import tracer_from_env
+
+
+class AppContext:
+    # The objects every request of a process shares: built once at startup
+    # and handed to each Controller, so that caches outlive the request that
+    # filled them. All of them are safe to use from several threads. In the
+    # prefork mode each worker gets its own copy with the fork.
+    def __init__(self) -> None:
+        self.repository = Repository()
+        self.rate_book = RateBook(self.repository)
+        self.response_cache = ResponseCache()
+        self.profiler = profiler_from_env()
+        self.tracer = tracer_from_env()
+        # Write-behind for rate updates is off unless a flush interval is set.
+        write_behind_ms = env_setting(ENV_WRITE_BEHIND_MS, 0, non_negative_int)
+        max_pending = env_setting(
+            ENV_WRITE_BEHIND_MAX_PENDING, DEFAULT_WRITE_BEHIND_MAX_PENDING, positive_int
+        )
+        self.writer = (
+            RateWriter(
+                self.repository, self.rate_book, write_behind_ms / 1000, max_pending
+            )
+            if write_behind_ms > 0
+            else None
+        )
+        self.service = Service(self.repository, self.rate_book, self.writer)
+
+    def warm_up(self) -> None:
+        # Migrates the database once per server, ahead of the prefork workers,
+        # since connections only set their pragmas. Then loads the currencies
+        # and rates before the first request, so that it resolves codes without
+        # queries too. If the database is not reachable yet, the first request
+        # loads them instead.
+        try:
+            migrate_db(pool.db_path)
+        except OperationalError as error:
+            logger.warning(f'Database not migrated at startup: {error}')
+        try:
+            self.rate_book.current()
+        except NoDataBaseConnectionError as error:
+            logger.warning(f'Rate book not loaded at startup: {error}')
+
+    def close(self) -> None:
+        # Writes the pending rate updates before the connections are closed.
+        if self.writer is not None:
+            self.writer.stop()
+        pool.close_all()
@@ -0,0 +1,75 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from email.message import Message
+from typing import Any
+from urllib.parse import quote
+
+from loguru import logger
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.mvc_layers.controller import Controller, Request
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+# An app server imports this module once per worker process.
+context = AppContext()
+
+
+async def application(scope: Scope, receive: Receive, send: Send) -> None:
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    headers = Message()
+    for name, value in scope['headers']:
+        headers[name.decode('latin-1')] = value.decode('latin-1')
+
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+    path = scope.get('raw_path') or quote(scope['path'].encode('utf-8'))
+    if isinstance(path, bytes):
+        path = path.decode('latin-1')
+    if scope['query_string']:
+        path = f'{path}?{scope["query_string"].decode("latin-1")}'
+
+    # Every request checks the data version in SQLite, so none is handled
+    # on the event loop itself.
+    controller = Controller(
+        Request(scope['method'], path, headers, body), context, sync_version=True
+    )
+    response = await asyncio.to_thread(controller.handle)
+
+    if response.error is not None:
+        logger.info(f'code {response.status}, message {response.error}')
+    await send(
+        {
+            'type': 'http.response.start',
+            'status': response.status,
+            'headers': [
+                (keyword.lower().encode('latin-1'), value.encode('latin-1'))
+                for keyword, value in response.headers
+            ],
+        }
+    )
+    await send({'type': 'http.response.body', 'body': response.body})
+
+
+async def lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await asyncio.to_thread(context.warm_up)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.to_thread(context.close)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
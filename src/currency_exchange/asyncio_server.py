@@ -0,0 +1,214 @@
+import asyncio
+from argparse import ArgumentParser
+from asyncio import StreamReader, StreamWriter
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from http.client import HTTPException, LineTooLong, parse_headers
+from io import BytesIO
+
+from loguru import logger
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import (
+    DEFAULT_THREADED_WORKERS,
+    KEEP_ALIVE_TIMEOUT,
+    MAX_KEEP_ALIVE_REQUESTS,
+    REQUEST_QUEUE_SIZE,
+)
+from currency_exchange.exceptions import ConfigurationError
+from currency_exchange.main import add_address_arguments, add_workers_argument
+from currency_exchange.mvc_layers.controller import (
+    Controller,
+    Request,
+    Response,
+    error_response,
+)
+from currency_exchange.servers import content_length, framing_error
+
+MAX_REQUEST_HEAD_SIZE = 65536
+
+
+class AsyncioHTTPServer:
+    # One event loop serves every connection, so idle and keep-alive clients
+    # cost a coroutine each instead of a thread. GET requests are answered on
+    # the loop while the rate book is current, since they touch the database
+    # then only to look up a code the rate book does not know, once per code;
+    # everything else runs in a small thread pool.
+    def __init__(
+        self,
+        server_address: tuple[str, int],
+        context: AppContext,
+        workers: int = DEFAULT_THREADED_WORKERS,
+    ) -> None:
+        self.server_address = server_address
+        self.context = context
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='db-worker'
+        )
+
+    async def serve_forever(self) -> None:
+        host, port = self.server_address
+        server = await asyncio.start_server(
+            self.handle_connection,
+            host,
+            port,
+            backlog=REQUEST_QUEUE_SIZE,
+            limit=MAX_REQUEST_HEAD_SIZE,
+        )
+        async with server:
+            await server.serve_forever()
+
+    def server_close(self) -> None:
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def handle_connection(
+        self, reader: StreamReader, writer: StreamWriter
+    ) -> None:
+        peer = writer.get_extra_info('peername')
+        client = peer[0] if peer else '-'
+        try:
+            for handled_requests in range(1, MAX_KEEP_ALIVE_REQUESTS + 1):
+                keep_alive = await self.handle_request(
+                    reader, writer, client, handled_requests < MAX_KEEP_ALIVE_REQUESTS
+                )
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, TimeoutError):
+            pass
+        except Exception:
+            logger.exception(f'Error while serving {client}')
+        finally:
+            writer.close()
+
+    async def handle_request(
+        self,
+        reader: StreamReader,
+        writer: StreamWriter,
+        client: str,
+        may_keep_alive: bool,
+    ) -> bool:
+        try:
+            head = await asyncio.wait_for(
+                reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT
+            )
+        except asyncio.LimitOverrunError:
+            return await self.reject(
+                writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Line too long'
+            )
+        except (asyncio.IncompleteReadError, TimeoutError):
+            return False
+
+        raw_request_line, _, raw_headers = head.partition(b'\r\n')
+        request_line = str(raw_request_line, 'iso-8859-1')
+        words = request_line.split()
+        if len(words) != 3:
+            return await self.reject(
+                writer, HTTPStatus.BAD_REQUEST, f'Bad request syntax ({request_line!r})'
+            )
+        method, path, version = words
+        if version not in ('HTTP/1.0', 'HTTP/1.1'):
+            if version.startswith('HTTP/') and version[5:6].isdigit():
+                return await self.reject(
+                    writer,
+                    HTTPStatus.HTTP_VERSION_NOT_SUPPORTED,
+                    f'Invalid HTTP version ({version[5:]})',
+                )
+            return await self.reject(
+                writer, HTTPStatus.BAD_REQUEST, f'Bad request version ({version!r})'
+            )
+
+        try:
+            headers = parse_headers(BytesIO(raw_headers))
+        except LineTooLong:
+            return await self.reject(
+                writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Line too long'
+            )
+        except HTTPException:
+            return await self.reject(
+                writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Too many headers'
+            )
+        framing_error_response = framing_error(headers)
+        if framing_error_response is not None:
+            await self.send(writer, version, framing_error_response, False)
+            return False
+
+        if headers.get('Expect', '').lower() == '100-continue' and (
+            version == 'HTTP/1.1'
+        ):
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+        body = await asyncio.wait_for(
+            reader.readexactly(content_length(headers)), KEEP_ALIVE_TIMEOUT
+        )
+
+        if path.startswith('//'):
+            path = '/' + path.lstrip('/')
+        controller = Controller(Request(method, path, headers, body), self.context)
+        if controller.reads_rate_book_only and self.context.rate_book.is_current():
+            response = controller.handle()
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, controller.handle)
+
+        if response.error is not None:
+            logger.info(f'{client} code {response.status}, message {response.error}')
+        logger.info(f'{client} "{request_line}" {response.status}')
+
+        connection = headers.get('Connection', '').lower()
+        keep_alive = may_keep_alive and (
+            connection == 'keep-alive'
+            or (version == 'HTTP/1.1' and connection != 'close')
+        )
+        await self.send(writer, version, response, keep_alive)
+        return keep_alive
+
+    async def reject(self, writer: StreamWriter, code: int, message: str) -> bool:
+        await self.send(writer, 'HTTP/1.1', error_response(code, message), False)
+        return False
+
+    async def send(
+        self, writer: StreamWriter, version: str, response: Response, keep_alive: bool
+    ) -> None:
+        lines = [
+            f'HTTP/1.1 {response.status} {response.reason}',
+            f'Date: {formatdate(usegmt=True)}',
+            *(f'{keyword}: {value}' for keyword, value in response.headers),
+        ]
+        if not keep_alive:
+            lines.append('Connection: close')
+        elif version == 'HTTP/1.0':
+            lines.append('Connection: keep-alive')
+        head = '\r\n'.join(lines) + '\r\n\r\n'
+        writer.write(head.encode('latin-1', 'strict') + response.body)
+        await writer.drain()
+
+
+def serve_asyncio(addr: str, port: int, workers: int | None = None) -> None:
+    context = AppContext()
+    logger.info(f'Serving at {addr}:{port} (asyncio)')
+    context.warm_up()
+    server = AsyncioHTTPServer(
+        (addr, port), context, workers or DEFAULT_THREADED_WORKERS
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        context.close()
+
+
+def main() -> None:
+    parser = ArgumentParser(description='Currency exchange REST API asyncio server')
+    add_address_arguments(parser)
+    add_workers_argument(parser, 'threads for requests that need the database')
+    args = parser.parse_args()
+    try:
+        serve_asyncio(args.host, args.port, args.workers)
+    except ConfigurationError as error:
+        parser.error(str(error))
+
+
+if __name__ == '__main__':
+    main()
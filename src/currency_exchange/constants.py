@@ -1,24 +1,99 @@
 from pathlib import Path
+from tempfile import gettempdir
 
 EXCHANGE_RATE_HELPER_CUR_CODE = 'USD'
 
 NUMBER_OF_DECIMAL_PLACES_FOR_RATES = 6
 NUMBER_OF_DECIMAL_PLACES_FOR_JSON = 2
 
+MAX_BATCH_SIZE = 10_000
+MAX_IMPORT_SIZE = 200_000
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+MAX_PAGE_CURSOR = 2**63 - 1  # the largest SQLite integer
+
 PROJECT_ROOT = Path(__file__).resolve().parent
 DB_PATH = PROJECT_ROOT / 'db' / 'db.sqlite'
 FILE_PATH_CURRENCIES = PROJECT_ROOT / 'db' / 'data' / 'Currencies.csv'
 FILE_PATH_EXCHANGE_RATES = PROJECT_ROOT / 'db' / 'data' / 'ExchangeRates.csv'
 
+DB_TIMEOUT = 10.0
+DB_CACHE_SIZE_KIB = 16 * 1024
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_HEALTH_CHECK_INTERVAL = 30.0
+DB_LOAD_CACHE_SIZE_KIB = 256 * 1024
+LOAD_BATCH_SIZE = 50_000
+
+RATE_BOOK_TTL = 60.0
+
+METRICS_PREFIX = 'currency_exchange_'
+METRICS_LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+
+SERVER_MODE_SINGLE = 'single'
+SERVER_MODE_THREADED = 'threaded'
+SERVER_MODE_PREFORK = 'prefork'
+SERVER_MODES = (SERVER_MODE_SINGLE, SERVER_MODE_THREADED, SERVER_MODE_PREFORK)
+
+DEFAULT_THREADED_WORKERS = 16
+REQUEST_QUEUE_SIZE = 128
+
+KEEP_ALIVE_TIMEOUT = 5.0
+MAX_KEEP_ALIVE_REQUESTS = 100
+
+ENV_HOST = 'CURRENCY_EXCHANGE_HOST'
+ENV_PORT = 'CURRENCY_EXCHANGE_PORT'
+ENV_SERVER_MODE = 'CURRENCY_EXCHANGE_SERVER_MODE'
+ENV_WORKERS = 'CURRENCY_EXCHANGE_WORKERS'
+ENV_TRACE_SAMPLE_RATE = 'CURRENCY_EXCHANGE_TRACE_SAMPLE_RATE'
+ENV_TRACE_LOG = 'CURRENCY_EXCHANGE_TRACE_LOG'
+ENV_PROFILE_TOKEN = 'CURRENCY_EXCHANGE_PROFILE_TOKEN'  # noqa: S105
+ENV_PROFILE_DIR = 'CURRENCY_EXCHANGE_PROFILE_DIR'
+ENV_PROFILE_FORMAT = 'CURRENCY_EXCHANGE_PROFILE_FORMAT'
+ENV_PROFILE_PER_MINUTE = 'CURRENCY_EXCHANGE_PROFILE_PER_MINUTE'
+ENV_WRITE_BEHIND_MS = 'CURRENCY_EXCHANGE_WRITE_BEHIND_MS'
+ENV_WRITE_BEHIND_MAX_PENDING = 'CURRENCY_EXCHANGE_WRITE_BEHIND_MAX_PENDING'
+
+DEFAULT_PROFILE_DIR = Path(gettempdir()) / 'currency_exchange_profiles'
+
+DEFAULT_WRITE_BEHIND_MAX_PENDING = 1000
+
 CREATE_CURRENCY_SQL = """
 INSERT INTO Currencies
 (Code, FullName, Sign)
 VALUES (?, ?, ?)
+RETURNING ID
 """
 
 GET_CURRENCIES_SQL = """
-SELECT *
+SELECT ID, Code, FullName, Sign
+FROM Currencies
+"""
+
+# Keyset pagination: a page starts after the last ID of the previous one, so
+# every page is a range seek on the primary key however deep it is.
+GET_CURRENCIES_PAGE_SQL = """
+SELECT ID, Code, FullName, Sign
 FROM Currencies
+WHERE ID > ?
+ORDER BY ID
+LIMIT ?
 """
 
 GET_CURRENCY_BY_CODE_SQL = """
@@ -35,13 +110,70 @@ WHERE ID = ?
 
 CREATE_EXCHANGE_RATE_SQL = """
 INSERT INTO ExchangeRates
-(BaseCurrencyId, TargetCurrencyId, Rate)
-VALUES (?, ?, ?)
+(BaseCurrencyId, TargetCurrencyId, Rate, UpdatedAt)
+VALUES (?, ?, ?, (julianday('now') - 2440587.5) * 86400.0)
+RETURNING ID
 """
 
-GET_EXCHANGE_RATES_SQL = """
-SELECT *
-FROM ExchangeRates
+GET_EXCHANGE_RATES_WITH_CURRENCIES_SQL = """
+SELECT r.ID, r.Rate,
+b.ID, b.Code, b.FullName, b.Sign,
+t.ID, t.Code, t.FullName, t.Sign
+FROM ExchangeRates AS r
+JOIN Currencies AS b ON b.ID = r.BaseCurrencyId
+JOIN Currencies AS t ON t.ID = r.TargetCurrencyId
+ORDER BY r.ID
+"""
+
+# One statement per filter, so that each is planned on its own index:
+# rates_base and rates_target end with the ID, which keeps the filtered pages
+# range seeks too, and the pair filter uses rates_base_target.
+GET_EXCHANGE_RATES_PAGE_SQL = """
+SELECT r.ID, r.Rate,
+b.ID, b.Code, b.FullName, b.Sign,
+t.ID, t.Code, t.FullName, t.Sign
+FROM ExchangeRates AS r
+JOIN Currencies AS b ON b.ID = r.BaseCurrencyId
+JOIN Currencies AS t ON t.ID = r.TargetCurrencyId
+WHERE r.ID > ?
+ORDER BY r.ID
+LIMIT ?
+"""
+
+GET_EXCHANGE_RATES_PAGE_BY_BASE_SQL = """
+SELECT r.ID, r.Rate,
+b.ID, b.Code, b.FullName, b.Sign,
+t.ID, t.Code, t.FullName, t.Sign
+FROM ExchangeRates AS r
+JOIN Currencies AS b ON b.ID = r.BaseCurrencyId
+JOIN Currencies AS t ON t.ID = r.TargetCurrencyId
+WHERE r.BaseCurrencyId = ? AND r.ID > ?
+ORDER BY r.ID
+LIMIT ?
+"""
+
+GET_EXCHANGE_RATES_PAGE_BY_TARGET_SQL = """
+SELECT r.ID, r.Rate,
+b.ID, b.Code, b.FullName, b.Sign,
+t.ID, t.Code, t.FullName, t.Sign
+FROM ExchangeRates AS r
+JOIN Currencies AS b ON b.ID = r.BaseCurrencyId
+JOIN Currencies AS t ON t.ID = r.TargetCurrencyId
+WHERE r.TargetCurrencyId = ? AND r.ID > ?
+ORDER BY r.ID
+LIMIT ?
+"""
+
+GET_EXCHANGE_RATES_PAGE_BY_PAIR_SQL = """
+SELECT r.ID, r.Rate,
+b.ID, b.Code, b.FullName, b.Sign,
+t.ID, t.Code, t.FullName, t.Sign
+FROM ExchangeRates AS r
+JOIN Currencies AS b ON b.ID = r.BaseCurrencyId
+JOIN Currencies AS t ON t.ID = r.TargetCurrencyId
+WHERE r.BaseCurrencyId = ? AND r.TargetCurrencyId = ? AND r.ID > ?
+ORDER BY r.ID
+LIMIT ?
 """
 
 GET_EXCHANGE_RATE_SQL = """
@@ -52,22 +184,92 @@ WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
 
 UPDATE_EXCHANGE_RATE_SQL = """
 UPDATE ExchangeRates
-SET Rate = ?
+SET Rate = ?, UpdatedAt = (julianday('now') - 2440587.5) * 86400.0
 WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
+RETURNING ID
 """
 
-GET_LAST_CREATED_ID_SQL = 'SELECT last_insert_rowid()'
+# The write-behind flush, run with executemany(), which rejects RETURNING.
+# Each rate carries the moment it was acknowledged (?2) and is skipped if the
+# pair has been written since, by another process's flush or a direct write.
+UPDATE_EXCHANGE_RATES_SQL = """
+UPDATE ExchangeRates
+SET Rate = ?1, UpdatedAt = ?2
+WHERE BaseCurrencyId = ?3 AND TargetCurrencyId = ?4
+AND (UpdatedAt IS NULL OR UpdatedAt < ?2)
+"""
 
-GET_LAST_UPDATED_ID_SQL = """
-SELECT ID
-FROM ExchangeRates
-WHERE BaseCurrencyId = ? AND TargetCurrencyId = ?
+# Pairs of a bulk import, joined with ExchangeRates through its unique index
+# instead of reading the whole table.
+CREATE_IMPORT_PAIRS_TABLE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS ImportPairs (
+    BaseCurrencyId INTEGER NOT NULL,
+    TargetCurrencyId INTEGER NOT NULL
+)
 """
 
+INSERT_INTO_IMPORT_PAIRS_SQL = """
+INSERT INTO temp.ImportPairs
+(BaseCurrencyId, TargetCurrencyId)
+VALUES (?, ?)
+"""
+
+GET_IMPORT_PAIR_IDS_SQL = """
+SELECT r.BaseCurrencyId, r.TargetCurrencyId, r.ID
+FROM temp.ImportPairs AS p
+JOIN ExchangeRates AS r
+ON r.BaseCurrencyId = p.BaseCurrencyId AND r.TargetCurrencyId = p.TargetCurrencyId
+"""
+
+CLEAR_IMPORT_PAIRS_SQL = 'DELETE FROM temp.ImportPairs'
+
+UPSERT_EXCHANGE_RATE_SQL = """
+INSERT INTO ExchangeRates
+(BaseCurrencyId, TargetCurrencyId, Rate, UpdatedAt)
+VALUES (?, ?, ?, (julianday('now') - 2440587.5) * 86400.0)
+ON CONFLICT (BaseCurrencyId, TargetCurrencyId) DO UPDATE
+SET Rate = excluded.Rate, UpdatedAt = excluded.UpdatedAt
+"""
+
+# executemany() rejects statements that return rows, hence the separate
+# single-row version.
+PUT_EXCHANGE_RATE_SQL = """
+INSERT INTO ExchangeRates
+(BaseCurrencyId, TargetCurrencyId, Rate, UpdatedAt)
+VALUES (?, ?, ?, (julianday('now') - 2440587.5) * 86400.0)
+ON CONFLICT (BaseCurrencyId, TargetCurrencyId) DO UPDATE
+SET Rate = excluded.Rate, UpdatedAt = excluded.UpdatedAt
+RETURNING ID
+"""
+
+BEGIN_IMMEDIATE_SQL = 'BEGIN IMMEDIATE'
+
+HEALTH_CHECK_SQL = 'SELECT 1'
+
+GET_DATA_VERSION_SQL = """
+SELECT Version
+FROM DataVersion
+WHERE ID = 1
+"""
+
+BUMP_DATA_VERSION_SQL = """
+UPDATE DataVersion
+SET Version = Version + 1
+WHERE ID = 1
+RETURNING Version
+"""
+
+CONNECTION_PRAGMAS_SQL = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    f'PRAGMA cache_size = -{DB_CACHE_SIZE_KIB}',
+    f'PRAGMA mmap_size = {DB_MMAP_SIZE}',
+)
+
 DROP_CURRENCIES_TABLE_SQL = 'DROP TABLE IF EXISTS Currencies'
 
 CREATE_CURRENCIES_TABLE_SQL = """
-CREATE TABLE Currencies (
+CREATE TABLE IF NOT EXISTS Currencies (
 ID INTEGER PRIMARY KEY,
 Code VARCHAR NOT NULL,
 FullName VARCHAR NOT NULL,
@@ -75,11 +277,24 @@ Sign VARCHAR NOT NULL
 )
 """
 CREATE_UNIQUE_INDEX_CURRENCIES_SQL = """
-CREATE UNIQUE INDEX
+CREATE UNIQUE INDEX IF NOT EXISTS
 currencies_code
 ON Currencies(Code)
 """
 
+CREATE_DATA_VERSION_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS DataVersion (
+ID INTEGER PRIMARY KEY CHECK (ID = 1),
+Version INTEGER NOT NULL
+)
+"""
+
+INIT_DATA_VERSION_SQL = """
+INSERT OR IGNORE INTO DataVersion
+(ID, Version)
+VALUES (1, 0)
+"""
+
 INSERT_INTO_CURRENCIES_SQL = """
 INSERT OR IGNORE INTO Currencies
 (Code, FullName, Sign)
@@ -88,29 +303,127 @@ VALUES (?, ?, ?)
 
 DROP_EXCHANGE_RATES_TABLE_SQL = 'DROP TABLE IF EXISTS ExchangeRates'
 
+# UpdatedAt is when the API last wrote the rate, in Unix seconds; rows loaded
+# by create_db have none.
 CREATE_EXCHANGE_RATES_TABLE_SQL = """
-CREATE TABLE ExchangeRates (
+CREATE TABLE IF NOT EXISTS ExchangeRates (
 ID INTEGER PRIMARY KEY,
 BaseCurrencyId INTEGER NOT NULL,
 TargetCurrencyId INTEGER NOT NULL,
-Rate NUMERIC NOT NULL
+Rate NUMERIC NOT NULL,
+UpdatedAt REAL
 )
 """
 
+HAS_RATE_UPDATED_AT_SQL = """
+SELECT 1
+FROM pragma_table_info('ExchangeRates')
+WHERE name = 'UpdatedAt'
+"""
+
+ADD_RATE_UPDATED_AT_SQL = 'ALTER TABLE ExchangeRates ADD COLUMN UpdatedAt REAL'
+
+
 CREATE_UNIQUE_INDEX_EXCHANGE_RATES_SQL = """
-CREATE UNIQUE INDEX
+CREATE UNIQUE INDEX IF NOT EXISTS
 rates_base_target
 ON ExchangeRates(BaseCurrencyId, TargetCurrencyId)
 """
 
+# Indexes of the filtered rate pages; databases created before them get them
+# from migrate_db at server startup.
+CREATE_RATE_PAGE_INDEXES_SQL = (
+    'CREATE INDEX IF NOT EXISTS rates_base ON ExchangeRates(BaseCurrencyId, ID)',
+    'CREATE INDEX IF NOT EXISTS rates_target ON ExchangeRates(TargetCurrencyId, ID)',
+)
+
 INSERT_INTO_EXCHANGE_RATES_SQL = """
 INSERT OR IGNORE INTO ExchangeRates
 (BaseCurrencyId, TargetCurrencyId, Rate)
 VALUES (?, ?, ?)
 """
 
-GET_ID_FROM_CURRENCIES_SQL = """
-SELECT ID
+DROP_RATE_HISTORY_TABLE_SQL = 'DROP TABLE IF EXISTS ExchangeRateHistory'
+
+# The history is set up completely once its last trigger exists.
+HAS_RATE_HISTORY_SQL = """
+SELECT 1
+FROM sqlite_master
+WHERE type = 'trigger' AND name = 'rate_history_on_update'
+"""
+
+# Every rate a pair has had, keyed by the moment it took effect. The primary
+# key of a WITHOUT ROWID table is the table itself, so a point-in-time lookup
+# is a single seek that reads the rate without touching anything else. Two
+# writes of a pair within one statement (or one millisecond) share a
+# timestamp; the later wins. The triggers upsert rather than INSERT OR REPLACE,
+# because the upsert of the bulk import and PUT overrides their conflict
+# policy with its own, and a repeated timestamp would abort the write.
+# ValidFrom is in Unix seconds with a fraction (unixepoch('subsec') needs
+# SQLite 3.42).
+CREATE_RATE_HISTORY_SQL = (
+    """
+CREATE TABLE IF NOT EXISTS ExchangeRateHistory (
+BaseCurrencyId INTEGER NOT NULL,
+TargetCurrencyId INTEGER NOT NULL,
+ValidFrom REAL NOT NULL,
+Rate NUMERIC NOT NULL,
+RateId INTEGER NOT NULL,
+PRIMARY KEY (BaseCurrencyId, TargetCurrencyId, ValidFrom)
+) WITHOUT ROWID
+""",
+    """
+INSERT OR REPLACE INTO ExchangeRateHistory
+(BaseCurrencyId, TargetCurrencyId, ValidFrom, Rate, RateId)
+SELECT BaseCurrencyId, TargetCurrencyId,
+(julianday('now') - 2440587.5) * 86400.0, Rate, ID
+FROM ExchangeRates
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS rate_history_on_insert
+AFTER INSERT ON ExchangeRates
+BEGIN
+INSERT INTO ExchangeRateHistory
+(BaseCurrencyId, TargetCurrencyId, ValidFrom, Rate, RateId)
+VALUES (
+NEW.BaseCurrencyId, NEW.TargetCurrencyId,
+(julianday('now') - 2440587.5) * 86400.0, NEW.Rate, NEW.ID
+)
+ON CONFLICT DO UPDATE SET Rate = excluded.Rate, RateId = excluded.RateId;
+END
+""",
+    """
+CREATE TRIGGER IF NOT EXISTS rate_history_on_update
+AFTER UPDATE OF Rate ON ExchangeRates
+WHEN NEW.Rate IS NOT OLD.Rate
+BEGIN
+INSERT INTO ExchangeRateHistory
+(BaseCurrencyId, TargetCurrencyId, ValidFrom, Rate, RateId)
+VALUES (
+NEW.BaseCurrencyId, NEW.TargetCurrencyId,
+(julianday('now') - 2440587.5) * 86400.0, NEW.Rate, NEW.ID
+)
+ON CONFLICT DO UPDATE SET Rate = excluded.Rate, RateId = excluded.RateId;
+END
+""",
+)
+
+GET_EXCHANGE_RATE_AT_SQL = """
+SELECT RateId, Rate
+FROM ExchangeRateHistory
+WHERE BaseCurrencyId = ? AND TargetCurrencyId = ? AND ValidFrom <= ?
+ORDER BY ValidFrom DESC
+LIMIT 1
+"""
+
+GET_CURRENCY_IDS_SQL = """
+SELECT Code, ID
 FROM Currencies
-WHERE code = ?
 """
+
+BULK_LOAD_PRAGMAS_SQL = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    f'PRAGMA cache_size = -{DB_LOAD_CACHE_SIZE_KIB}',
+)
@@ -1,80 +1,255 @@
 import csv
+from argparse import ArgumentParser
+from collections.abc import Iterable, Iterator
+from contextlib import closing
 from decimal import Decimal
-from sqlite3 import OperationalError, connect
+from itertools import islice
+from pathlib import Path
+from sqlite3 import Cursor, OperationalError, connect
+from time import perf_counter
+from typing import Any
 
 from loguru import logger
 
 from currency_exchange.constants import (
+    ADD_RATE_UPDATED_AT_SQL,
+    BEGIN_IMMEDIATE_SQL,
+    BULK_LOAD_PRAGMAS_SQL,
+    BUMP_DATA_VERSION_SQL,
     CREATE_CURRENCIES_TABLE_SQL,
+    CREATE_DATA_VERSION_TABLE_SQL,
     CREATE_EXCHANGE_RATES_TABLE_SQL,
+    CREATE_RATE_HISTORY_SQL,
+    CREATE_RATE_PAGE_INDEXES_SQL,
     CREATE_UNIQUE_INDEX_CURRENCIES_SQL,
     CREATE_UNIQUE_INDEX_EXCHANGE_RATES_SQL,
     DB_PATH,
+    DB_TIMEOUT,
     DROP_CURRENCIES_TABLE_SQL,
     DROP_EXCHANGE_RATES_TABLE_SQL,
+    DROP_RATE_HISTORY_TABLE_SQL,
     FILE_PATH_CURRENCIES,
     FILE_PATH_EXCHANGE_RATES,
-    GET_ID_FROM_CURRENCIES_SQL,
+    GET_CURRENCY_IDS_SQL,
+    HAS_RATE_HISTORY_SQL,
+    HAS_RATE_UPDATED_AT_SQL,
+    INIT_DATA_VERSION_SQL,
     INSERT_INTO_CURRENCIES_SQL,
     INSERT_INTO_EXCHANGE_RATES_SQL,
+    LOAD_BATCH_SIZE,
     NUMBER_OF_DECIMAL_PLACES_FOR_RATES,
 )
 from currency_exchange.utils.data_helpers import round_decimal
 
 
-def create_db() -> None:
-    with connect(str(DB_PATH)) as conn:
+class LoadProgress:
+    # Counts the rows read from a csv-file and the rows actually inserted
+    # (duplicates are ignored), and logs the throughput after every batch.
+    def __init__(self, table: str) -> None:
+        self.table = table
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.started = perf_counter()
+
+    def add(self, read: int, inserted: int) -> None:
+        self.read += read
+        self.inserted += inserted
+        elapsed = perf_counter() - self.started
+        logger.info(
+            f'{self.table}: {self.read} rows read, {self.inserted} inserted, '
+            f'{self.read / elapsed:.0f} rows/s'
+        )
+
+
+def create_db(
+    currencies_path: Path = FILE_PATH_CURRENCIES,
+    rates_path: Path = FILE_PATH_EXCHANGE_RATES,
+    append: bool = False,
+) -> None:
+    # The whole load is one transaction, so a failed load leaves the database
+    # as it was. Syncs are off while loading: the risk is limited to a power
+    # loss in the middle, after which the load has to be run again anyway.
+    started = perf_counter()
+    currencies = LoadProgress('Currencies')
+    rates = LoadProgress('ExchangeRates')
+    with closing(connect(str(DB_PATH), isolation_level=None)) as conn:
         cur = conn.cursor()
-        cur.execute(DROP_CURRENCIES_TABLE_SQL)
-        cur.execute(CREATE_CURRENCIES_TABLE_SQL)
-        cur.execute(CREATE_UNIQUE_INDEX_CURRENCIES_SQL)
+        for pragma in BULK_LOAD_PRAGMAS_SQL:
+            cur.execute(pragma)
 
-        with FILE_PATH_CURRENCIES.open(encoding='utf-8', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
+        cur.execute(BEGIN_IMMEDIATE_SQL)
+        try:
+            if not append:
+                cur.execute(DROP_CURRENCIES_TABLE_SQL)
+                cur.execute(DROP_EXCHANGE_RATES_TABLE_SQL)
+                cur.execute(DROP_RATE_HISTORY_TABLE_SQL)
+            cur.execute(CREATE_CURRENCIES_TABLE_SQL)
+            cur.execute(CREATE_EXCHANGE_RATES_TABLE_SQL)
+            # Fresh tables get their unique indexes and the rate history after
+            # the load, built once instead of updated per row; duplicates in
+            # the files are dropped in memory meanwhile. Appending needs them
+            # to skip stored rows and to record the new ones.
+            if append:
+                create_indexes(cur)
+                create_rate_history(cur)
 
-            for row in reader:
-                code = row['Code']
-                name = row['Name']
-                sign = row['Sign']
+            insert_batched(
+                cur,
+                INSERT_INTO_CURRENCIES_SQL,
+                read_currencies(currencies_path),
+                currencies,
+            )
+            currency_ids: dict[str, int] = dict(cur.execute(GET_CURRENCY_IDS_SQL))
 
-                cur.execute(
-                    INSERT_INTO_CURRENCIES_SQL,
-                    (code, name, sign),
+            insert_batched(
+                cur,
+                INSERT_INTO_EXCHANGE_RATES_SQL,
+                read_rates(rates_path, currency_ids, rates),
+                rates,
+            )
+            if rates.skipped:
+                logger.warning(
+                    f'ExchangeRates: {rates.skipped} rows skipped, '
+                    'unknown currency code'
                 )
 
-        cur.execute(DROP_EXCHANGE_RATES_TABLE_SQL)
-        cur.execute(CREATE_EXCHANGE_RATES_TABLE_SQL)
-        cur.execute(CREATE_UNIQUE_INDEX_EXCHANGE_RATES_SQL)
+            if not append:
+                create_indexes(cur)
+                create_rate_history(cur)
+            cur.execute(CREATE_DATA_VERSION_TABLE_SQL)
+            cur.execute(INIT_DATA_VERSION_SQL)
+            cur.execute(BUMP_DATA_VERSION_SQL).fetchone()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
 
-        with FILE_PATH_EXCHANGE_RATES.open(encoding='utf-8', newline='') as csvfile:
-            reader = csv.DictReader(csvfile)
+    logger.info(
+        f'DB with tables "Currencies" and "ExchangeRates" has just '
+        f'{"updated" if append else "created"}: '
+        f'{currencies.inserted} currencies, {rates.inserted} exchange rates '
+        f'in {perf_counter() - started:.2f} s'
+    )
 
-            for row in reader:
-                base_cur_code = row['Base']
-                target_cur_code = row['Targ']
-                rate_str = row['Rate']
 
-                rate_dec = round_decimal(
-                    Decimal(rate_str), NUMBER_OF_DECIMAL_PLACES_FOR_RATES
-                )
+def migrate_db(db_path: Path = DB_PATH) -> None:
+    # Brings a database created by an earlier version up to date: the data
+    # version table, the rate page indexes, the write time of rates and the
+    # rate history, started from the current rates. Servers run it once at startup, before any worker is
+    # forked; the write lock keeps concurrent runs from seeding twice.
+    with closing(
+        connect(str(db_path), timeout=DB_TIMEOUT, isolation_level=None)
+    ) as conn:
+        cur = conn.cursor()
+        cur.execute(BEGIN_IMMEDIATE_SQL)
+        try:
+            cur.execute(CREATE_DATA_VERSION_TABLE_SQL)
+            cur.execute(INIT_DATA_VERSION_SQL)
+            for index_sql in CREATE_RATE_PAGE_INDEXES_SQL:
+                cur.execute(index_sql)
+            if cur.execute(HAS_RATE_UPDATED_AT_SQL).fetchone() is None:
+                cur.execute(ADD_RATE_UPDATED_AT_SQL)
+            create_rate_history(cur)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
 
-                cur.execute(GET_ID_FROM_CURRENCIES_SQL, (base_cur_code,))
-                base_cur_id = cur.fetchone()[0]
 
-                cur.execute(GET_ID_FROM_CURRENCIES_SQL, (target_cur_code,))
-                target_cur_id = cur.fetchone()[0]
+def create_indexes(cur: Cursor) -> None:
+    cur.execute(CREATE_UNIQUE_INDEX_CURRENCIES_SQL)
+    cur.execute(CREATE_UNIQUE_INDEX_EXCHANGE_RATES_SQL)
+    for index_sql in CREATE_RATE_PAGE_INDEXES_SQL:
+        cur.execute(index_sql)
 
-                cur.execute(
-                    INSERT_INTO_EXCHANGE_RATES_SQL,
-                    (base_cur_id, target_cur_id, str(rate_dec)),
-                )
 
-        logger.info('DB with tables "Currencies" and "ExchangeRates" has just created')
+def create_rate_history(cur: Cursor) -> None:
+    if cur.execute(HAS_RATE_HISTORY_SQL).fetchone() is None:
+        for rate_history_sql in CREATE_RATE_HISTORY_SQL:
+            cur.execute(rate_history_sql)
 
 
-if __name__ == '__main__':
+def insert_batched(
+    cur: Cursor, sql: str, rows: Iterable[tuple[Any, ...]], progress: LoadProgress
+) -> None:
+    progress.started = perf_counter()
+    row_iter = iter(rows)
+    while batch := list(islice(row_iter, LOAD_BATCH_SIZE)):
+        cur.executemany(sql, batch)
+        progress.add(len(batch), cur.rowcount)
+
+
+def read_currencies(path: Path) -> Iterator[tuple[str, str, str]]:
+    seen_codes: set[str] = set()
+    for code, name, sign in read_columns(path, ('Code', 'Name', 'Sign')):
+        if code not in seen_codes:
+            seen_codes.add(code)
+            yield code, name, sign
+
+
+def read_rates(
+    path: Path, currency_ids: dict[str, int], progress: LoadProgress
+) -> Iterator[tuple[int, int, str]]:
+    seen_pairs: set[tuple[int, int]] = set()
+    for base_cur_code, target_cur_code, rate_str in read_columns(
+        path, ('Base', 'Targ', 'Rate')
+    ):
+        base_cur_id = currency_ids.get(base_cur_code)
+        target_cur_id = currency_ids.get(target_cur_code)
+        if base_cur_id is None or target_cur_id is None:
+            progress.skipped += 1
+            continue
+
+        pair = (base_cur_id, target_cur_id)
+        if pair not in seen_pairs:
+            seen_pairs.add(pair)
+            rate_dec = round_decimal(
+                Decimal(rate_str), NUMBER_OF_DECIMAL_PLACES_FOR_RATES
+            )
+            yield base_cur_id, target_cur_id, str(rate_dec)
+
+
+def read_columns(path: Path, columns: tuple[str, ...]) -> Iterator[list[str]]:
+    # A plain reader picking columns by their header position, since building
+    # a dict per row is what a DictReader spends most of its time on.
+    with path.open(encoding='utf-8', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, [])
+        try:
+            positions = [header.index(column) for column in columns]
+        except ValueError:
+            raise csv.Error(f'{path} must have columns {", ".join(columns)}')
+        for row in reader:
+            if row:
+                yield [row[position] for position in positions]
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description='Create the currency exchange database from csv-files'
+    )
+    parser.add_argument(
+        '--currencies',
+        type=Path,
+        default=FILE_PATH_CURRENCIES,
+        help='csv-file with Code, Name, Sign columns',
+    )
+    parser.add_argument(
+        '--rates',
+        type=Path,
+        default=FILE_PATH_EXCHANGE_RATES,
+        help='csv-file with Base, Targ, Rate columns',
+    )
+    parser.add_argument(
+        '--append',
+        action='store_true',
+        help='add rows to the existing tables instead of recreating them',
+    )
+    args = parser.parse_args()
+
     try:
-        create_db()
+        create_db(args.currencies, args.rates, args.append)
     except OperationalError as error:
         logger.error(f'База данных недоступна: {error!s}')
     except FileNotFoundError as error:
@@ -85,3 +260,7 @@ if __name__ == '__main__':
         logger.error(f'Возникла ошибка при работе с csv-файлом: {error!s}')
     except Exception as error:
         logger.error(f'Возникла непредвиденная ошибка: {error!s}')
+
+
+if __name__ == '__main__':
+    main()
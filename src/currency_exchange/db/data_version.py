@@ -0,0 +1,25 @@
+from multiprocessing import Lock, RawValue
+
+UNKNOWN_VERSION = -1
+
+
+class DataVersion:
+    # Mirror of DataVersion.Version in anonymous shared memory. It is created on
+    # import, before pre-fork workers are spawned, so every worker sees the
+    # versions published by the others without querying the database. Reads
+    # are lock-free; publishing takes a lock so the value never goes back.
+    def __init__(self) -> None:
+        self._version = RawValue('q', UNKNOWN_VERSION)
+        self._lock = Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def publish(self, version: int) -> None:
+        with self._lock:
+            if version > self._version.value:
+                self._version.value = version
+
+
+data_version = DataVersion()
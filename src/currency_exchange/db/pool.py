@@ -0,0 +1,101 @@
+import os
+import weakref
+from pathlib import Path
+from sqlite3 import Connection, DatabaseError, connect
+from threading import Lock, local
+from time import monotonic
+
+from currency_exchange.constants import (
+    CONNECTION_PRAGMAS_SQL,
+    DB_HEALTH_CHECK_INTERVAL,
+    DB_PATH,
+    DB_TIMEOUT,
+    HEALTH_CHECK_SQL,
+)
+
+# Connections a forked child inherited from its parent. Closing them in the
+# child (which garbage collection would do) is a use of SQLite across fork
+# and drops the POSIX locks of the child's own connections to the same file,
+# so they are kept referenced here and never touched.
+_inherited_connections: list[Connection] = []
+
+
+class _ConnectionHolder:
+    def __init__(self, conn: Connection) -> None:
+        self.conn = conn
+        self.checked_at = monotonic()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        db_path: Path = DB_PATH,
+        health_check_interval: float = DB_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        self.db_path = db_path
+        self.health_check_interval = health_check_interval
+        self._local = local()
+        self._lock = Lock()
+        self._connections: set[Connection] = set()
+        os.register_at_fork(after_in_child=self._forget_inherited)
+
+    def connection(self) -> Connection:
+        holder: _ConnectionHolder | None = getattr(self._local, 'holder', None)
+        if holder is None:
+            holder = self._open_holder()
+        elif monotonic() - holder.checked_at > self.health_check_interval:
+            if not self._is_healthy(holder.conn):
+                self._discard(holder.conn)
+                holder = self._open_holder()
+            holder.checked_at = monotonic()
+        return holder.conn
+
+    def close_all(self) -> None:
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+        self._local = local()
+
+    def _open_holder(self) -> _ConnectionHolder:
+        conn = self._connect()
+        holder = _ConnectionHolder(conn)
+        with self._lock:
+            self._connections.add(conn)
+        weakref.finalize(holder, self._discard, conn)
+        self._local.holder = holder
+        return holder
+
+    def _connect(self) -> Connection:
+        # Each connection is used only by the thread that opened it, but it may
+        # be closed from another one (thread exit, close_all), hence the flag.
+        conn = connect(str(self.db_path), timeout=DB_TIMEOUT, check_same_thread=False)
+        for pragma_sql in CONNECTION_PRAGMAS_SQL:
+            conn.execute(pragma_sql)
+        return conn
+
+    def _discard(self, conn: Connection) -> None:
+        with self._lock:
+            if conn not in self._connections:
+                return
+            self._connections.discard(conn)
+        conn.close()
+
+    def _is_healthy(self, conn: Connection) -> bool:
+        try:
+            conn.execute(HEALTH_CHECK_SQL).fetchone()
+            return True
+        except DatabaseError:
+            return False
+
+    def _forget_inherited(self) -> None:
+        # SQLite handles must not be used across fork; the child sets them
+        # aside without closing and opens its own on first use.
+        _inherited_connections.extend(self._connections)
+        self._lock = Lock()
+        self._connections = set()
+        self._local = local()
+
+
+pool = ConnectionPool()
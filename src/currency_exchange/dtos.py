@@ -46,3 +46,30 @@ class ExchangePostDto:
     from_currency_code: str
     to_currency_code: str
     amount: Decimal
+
+
+@dataclass
+class ExchangeAllDto:
+    from_currency_code: str
+    amount: Decimal
+
+
+@dataclass
+class BatchItemErrorDto:
+    status: int
+    message: str
+
+
+@dataclass
+class RateImportItemDto:
+    row: int
+    status: int
+    message: str
+
+
+@dataclass
+class RateImportDto:
+    created: int
+    updated: int
+    failed: int
+    items: list[RateImportItemDto]
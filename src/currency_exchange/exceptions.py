@@ -24,3 +24,7 @@ class NoCurrencyPairError(Exception):
 
 class CantConvertError(Exception):
     pass
+
+
+class ConfigurationError(Exception):
+    pass
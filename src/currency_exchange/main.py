@@ -1,28 +1,133 @@
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+from argparse import ArgumentParser, Namespace
+from collections.abc import Callable
+from functools import partial
+from http.server import HTTPServer
+from typing import TypeVar
 
 from loguru import logger
 
-from currency_exchange.mvc_layers.controller import RequestHandler
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import (
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    DEFAULT_THREADED_WORKERS,
+    ENV_HOST,
+    ENV_PORT,
+    ENV_SERVER_MODE,
+    ENV_WORKERS,
+    SERVER_MODE_PREFORK,
+    SERVER_MODE_SINGLE,
+    SERVER_MODE_THREADED,
+    SERVER_MODES,
+)
+from currency_exchange.exceptions import ConfigurationError
+from currency_exchange.servers import (
+    PreforkSupervisor,
+    RequestHandler,
+    ThreadPoolHTTPServer,
+    serve,
+)
+from currency_exchange.settings import env_setting, positive_int
+
+T = TypeVar('T')
 
 
 def start_server(
     addr: str,
     port: int,
-    server_class: type[HTTPServer] = HTTPServer,
-    handler_class: type[BaseHTTPRequestHandler] = RequestHandler,
+    server_class: type[HTTPServer] | None = None,
+    handler_class: type[RequestHandler] = RequestHandler,
+    mode: str = SERVER_MODE_SINGLE,
+    workers: int | None = None,
 ) -> None:
     server_address = (addr, port)
+    context = AppContext()
+    logger.info(f'Serving at {addr}:{port} ({mode} mode)')
+    context.warm_up()
+    handler = partial(handler_class, context=context)
+
+    if mode == SERVER_MODE_PREFORK:
+        PreforkSupervisor(
+            server_address,
+            handler,
+            workers or os.cpu_count() or 1,
+            on_close=context.close,
+        ).run()
+    elif server_class is not None:
+        serve(server_class(server_address, handler), context.close)
+    elif mode == SERVER_MODE_THREADED:
+        serve(
+            ThreadPoolHTTPServer(
+                server_address, handler, workers or DEFAULT_THREADED_WORKERS
+            ),
+            context.close,
+        )
+    else:
+        serve(HTTPServer(server_address, handler), context.close)
+
+
+def env_default(
+    parser: ArgumentParser, name: str, default: T, convert: Callable[[str], T]
+) -> T:
+    # argparse checks neither the choices nor the types of defaults, so an
+    # option's value taken from the environment is checked here.
+    try:
+        return env_setting(name, default, convert)
+    except ConfigurationError as error:
+        parser.error(str(error))
+
+
+def server_mode(value: str) -> str:
+    if value not in SERVER_MODES:
+        raise ValueError(value)
+    return value
+
+
+def add_address_arguments(parser: ArgumentParser) -> None:
+    parser.add_argument('--host', default=os.environ.get(ENV_HOST, DEFAULT_HOST))
+    parser.add_argument(
+        '--port', type=int, default=env_default(parser, ENV_PORT, DEFAULT_PORT, int)
+    )
+
+
+def add_workers_argument(parser: ArgumentParser, help: str) -> None:
+    parser.add_argument(
+        '--workers',
+        type=positive_int,
+        default=env_default(parser, ENV_WORKERS, None, positive_int),
+        help=help,
+    )
+
+
+def parse_args() -> Namespace:
+    return make_parser().parse_args()
+
 
-    with server_class(server_address, handler_class) as httpd:
-        logger.info(f'Serving at {addr}:{port}')
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            httpd.server_close()
+def make_parser() -> ArgumentParser:
+    parser = ArgumentParser(description='Currency exchange REST API server')
+    add_address_arguments(parser)
+    parser.add_argument(
+        '--mode',
+        choices=SERVER_MODES,
+        default=env_default(parser, ENV_SERVER_MODE, SERVER_MODE_SINGLE, server_mode),
+        help='single-threaded, thread pool or pre-forked worker processes',
+    )
+    add_workers_argument(
+        parser, 'threads in the pool (threaded) or worker processes (prefork)'
+    )
+    return parser
 
 
 def main() -> None:
-    start_server('127.0.0.1', 8000)
+    parser = make_parser()
+    args = parser.parse_args()
+    # The settings read by the application context are checked as it is
+    # built, before the server binds.
+    try:
+        start_server(args.host, args.port, mode=args.mode, workers=args.workers)
+    except ConfigurationError as error:
+        parser.error(str(error))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,155 @@
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock, Thread, current_thread, local
+
+from currency_exchange.constants import METRICS_LATENCY_BUCKETS, METRICS_PREFIX
+
+Labels = tuple[tuple[str, str], ...]
+MetricKey = tuple[str, Labels]
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+METRICS = {
+    'http_requests_total': (COUNTER, 'HTTP requests handled'),
+    'http_request_duration_seconds': (HISTOGRAM, 'Time spent handling a request'),
+    'http_requests_in_flight': (GAUGE, 'HTTP requests being handled'),
+    'db_queries_total': (COUNTER, 'SQL statements executed by the DAOs'),
+    'db_transaction_duration_seconds': (
+        HISTOGRAM,
+        'Time spent in a DAO transaction',
+    ),
+    'response_cache_requests_total': (COUNTER, 'Lookups in the response cache'),
+    'write_behind_flushes_total': (COUNTER, 'Transactions of the write-behind writer'),
+    'write_behind_flushed_rates_total': (
+        COUNTER,
+        'Rates written by the write-behind writer',
+    ),
+}
+
+
+class MetricsShard:
+    # Written by one thread only, so recording takes no lock. A histogram is
+    # a list of per-bucket counts, the last bucket being +Inf, and the sum.
+    def __init__(self, thread: Thread | None = None) -> None:
+        self.thread = thread
+        self.values: defaultdict[MetricKey, float] = defaultdict(float)
+        self.histograms: dict[MetricKey, list[float]] = {}
+
+    def observe(self, key: MetricKey, value: float) -> None:
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = [0.0] * (len(METRICS_LATENCY_BUCKETS) + 2)
+            self.histograms[key] = histogram
+        histogram[bisect_left(METRICS_LATENCY_BUCKETS, value)] += 1
+        histogram[-1] += value
+
+    def merge(self, other: 'MetricsShard') -> None:
+        # dict.copy() runs without releasing the GIL, so a shard can be read
+        # while its thread keeps adding keys to it.
+        for key, value in other.values.copy().items():
+            self.values[key] += value
+        for key, histogram in other.histograms.copy().items():
+            merged = self.histograms.setdefault(key, [0.0] * len(histogram))
+            for position, value in enumerate(list(histogram)):
+                merged[position] += value
+
+
+class Metrics:
+    # Every thread records into a shard of its own, found through a
+    # thread-local, and a scrape sums the shards. Shards of threads that have
+    # exited are folded into `retired`, so the totals never go back. In the
+    # prefork mode each worker process keeps and reports its own metrics.
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._local = local()
+        self._shards: list[MetricsShard] = []
+        self._retired = MetricsShard()
+
+    def add_shard(self) -> MetricsShard:
+        shard = MetricsShard(current_thread())
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def inc(self, name: str, labels: Labels = (), amount: float = 1) -> None:
+        shard = getattr(self._local, 'shard', None) or self.add_shard()
+        shard.values[(name, labels)] += amount
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        shard = getattr(self._local, 'shard', None) or self.add_shard()
+        shard.observe((name, labels), value)
+
+    def collect(self) -> MetricsShard:
+        total = MetricsShard()
+        with self._lock:
+            alive = []
+            for shard in self._shards:
+                if shard.thread is not None and shard.thread.is_alive():
+                    alive.append(shard)
+                else:
+                    self._retired.merge(shard)
+            self._shards = alive
+            total.merge(self._retired)
+            for shard in alive:
+                total.merge(shard)
+        return total
+
+    def render(self) -> str:
+        # Prometheus text exposition format, version 0.0.4.
+        total = self.collect()
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            full_name = METRICS_PREFIX + name
+            lines.append(f'# HELP {full_name} {description}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            if kind == HISTOGRAM:
+                for (metric, labels), histogram in sorted(total.histograms.items()):
+                    if metric == name:
+                        lines.extend(render_histogram(full_name, labels, histogram))
+            else:
+                for (metric, labels), value in sorted(total.values.items()):
+                    if metric == name:
+                        lines.append(
+                            f'{full_name}{render_labels(labels)} {render_value(value)}'
+                        )
+        return '\n'.join(lines) + '\n'
+
+
+def render_histogram(name: str, labels: Labels, histogram: list[float]) -> list[str]:
+    lines = []
+    cumulative = 0
+    bounds = [repr(bound) for bound in METRICS_LATENCY_BUCKETS] + ['+Inf']
+    for bound, count in zip(bounds, histogram, strict=False):
+        cumulative += int(count)
+        lines.append(
+            f'{name}_bucket{render_labels((*labels, ("le", bound)))} {cumulative}'
+        )
+    lines.append(f'{name}_sum{render_labels(labels)} {render_value(histogram[-1])}')
+    lines.append(f'{name}_count{render_labels(labels)} {cumulative}')
+    return lines
+
+
+def render_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{escape_label_value(value)}"' for key, value in labels)
+    return '{' + pairs + '}'
+
+
+def render_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
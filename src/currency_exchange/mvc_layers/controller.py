@@ -1,13 +1,37 @@
+import csv
 import json
-from decimal import Decimal
+import os
+from collections.abc import Callable
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from email.message import Message
 from functools import cached_property
 from http import HTTPStatus
-from http.server import BaseHTTPRequestHandler
+from time import perf_counter
 from typing import Any
-from urllib.parse import ParseResult, parse_qsl, unquote, urlparse
+from urllib.parse import ParseResult, parse_qsl, unquote, urlencode, urlparse
 
-from currency_exchange.constants import NUMBER_OF_DECIMAL_PLACES_FOR_RATES
-from currency_exchange.dtos import CurrencyPostDto, ExchangePostDto, RatePostUpdateDto
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import (
+    DEFAULT_PAGE_LIMIT,
+    MAX_BATCH_SIZE,
+    MAX_IMPORT_SIZE,
+    MAX_PAGE_CURSOR,
+    MAX_PAGE_LIMIT,
+    NUMBER_OF_DECIMAL_PLACES_FOR_JSON,
+    NUMBER_OF_DECIMAL_PLACES_FOR_RATES,
+)
+from currency_exchange.db.data_version import UNKNOWN_VERSION, data_version
+from currency_exchange.dtos import (
+    BatchItemErrorDto,
+    CurrencyPostDto,
+    ExchangeAllDto,
+    ExchangeDto,
+    ExchangePostDto,
+    RateImportDto,
+    RateImportItemDto,
+    RatePostUpdateDto,
+)
 from currency_exchange.exceptions import (
     CantConvertError,
     CurrencyAlreadyExistsError,
@@ -17,21 +41,145 @@ from currency_exchange.exceptions import (
     NoRateError,
     RateAlreadyExistsError,
 )
-from currency_exchange.mvc_layers.service import Service
+from currency_exchange.metrics import metrics
+from currency_exchange.mvc_layers.service import ImportedRate, Page
+from currency_exchange.tracing import span, traced
 from currency_exchange.utils.data_helpers import (
     repl_dec_separator,
     round_decimal,
     serialize,
+    to_timestamp,
 )
 from currency_exchange.utils.validation import (
+    is_int_in_range,
     is_positive_number,
     is_valid_cur_code,
     is_valid_name,
     is_valid_sign,
+    is_valid_timestamp,
 )
 
 
-class RequestHandler(BaseHTTPRequestHandler):
+@dataclass
+class Request:
+    method: str
+    path: str
+    headers: Message
+    body: bytes = b''
+
+
+@dataclass
+class Response:
+    status: int
+    headers: list[tuple[str, str]]
+    body: bytes = b''
+    # The message of an error response, for the transport to log.
+    error: str | None = None
+
+    @property
+    def reason(self) -> str:
+        try:
+            return HTTPStatus(self.status).phrase
+        except ValueError:
+            return ''
+
+
+def error_response(
+    code: int, message: str | None = None, omit_body: bool = False
+) -> Response:
+    # Message body is omitted for cases described in:
+    #  - RFC7230: 3.3. 1xx, 204(No Content), 304(Not Modified)
+    #  - RFC7231: 6.3.6. 205(Reset Content)
+    response = Response(code, [])
+    if message is None:
+        message = response.reason or '???'
+    response.error = message
+    if code >= 200 and code not in (
+        HTTPStatus.NO_CONTENT,
+        HTTPStatus.RESET_CONTENT,
+        HTTPStatus.NOT_MODIFIED,
+    ):
+        content = {'message': message}
+        body = json.dumps(content, ensure_ascii=False).encode('utf-8')
+        response.headers.append(('Content-Type', 'application/json; charset=utf-8'))
+        response.headers.append(('Content-Length', str(len(body))))
+        if not omit_body:
+            response.body = body
+    return response
+
+
+class Controller:
+    # Routing and resource handlers, independent of the transport: a server
+    # adapter builds a Request, calls handle() with the process's AppContext
+    # and writes out the Response.
+    def __init__(
+        self, request: Request, context: AppContext, sync_version: bool = False
+    ) -> None:
+        self.request = request
+        self.context = context
+        self.service = context.service
+        self.sync_version = sync_version
+        self.command = request.method
+        self.path = request.path
+        self.headers = request.headers
+        self.request_body = request.body
+        self.response = error_response(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    def handle(self) -> Response:
+        method = getattr(self, 'do_' + self.command, None)
+        labels = (
+            ('method', self.command if method else 'other'),
+            ('route', self.route),
+        )
+        metrics.inc('http_requests_in_flight', labels)
+        started = perf_counter()
+        trace = self.context.tracer.start()
+        profile = self.context.profiler.start(self.headers)
+        try:
+            self.handle_request(method)
+        finally:
+            if profile is not None:
+                profile_name = self.context.profiler.finish(
+                    profile, self.command, self.route
+                )
+                self.response.headers.append(('X-Profile', profile_name))
+            metrics.inc('http_requests_in_flight', labels, -1)
+            if trace is not None:
+                server_timing = self.context.tracer.finish(
+                    trace,
+                    {
+                        'method': self.command,
+                        'route': self.route,
+                        'status': self.response.status,
+                    },
+                )
+                self.response.headers.append(('Server-Timing', server_timing))
+        metrics.observe(
+            'http_request_duration_seconds', labels, perf_counter() - started
+        )
+        metrics.inc(
+            'http_requests_total', (*labels, ('status', str(self.response.status)))
+        )
+        return self.response
+
+    def handle_request(self, method: Callable[[], None] | None) -> None:
+        if method is None:
+            self.send_error(
+                HTTPStatus.NOT_IMPLEMENTED, f'Unsupported method ({self.command!r})'
+            )
+            return
+
+        # Workers started by an app server do not share the data version
+        # mirror, so they have to check the database before every request.
+        if self.sync_version:
+            try:
+                self.context.rate_book.sync_version()
+            except NoDataBaseConnectionError as error:
+                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
+                return
+
+        method()
+
     def do_GET(self) -> None:
         if self.first_segment == 'currencies':
             self.get_currencies()
@@ -48,6 +196,9 @@ class RequestHandler(BaseHTTPRequestHandler):
         elif self.first_segment == 'exchange':
             self.exchange()
 
+        elif self.first_segment == 'metrics':
+            self.get_metrics()
+
         else:
             self.send_error(HTTPStatus.NOT_FOUND, 'Ресурс не найден')
 
@@ -56,7 +207,13 @@ class RequestHandler(BaseHTTPRequestHandler):
             self.create_currency()
 
         elif self.first_segment == 'exchangeRates':
-            self.create_rate()
+            if self.second_segment == 'bulk':
+                self.import_rates()
+            else:
+                self.create_rate()
+
+        elif self.first_segment == 'exchange':
+            self.exchange_batch()
 
         else:
             self.send_error(HTTPStatus.NOT_FOUND, 'Ресурс не найден')
@@ -68,17 +225,38 @@ class RequestHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(HTTPStatus.NOT_FOUND, 'Ресурс не найден')
 
+    def do_PUT(self) -> None:
+        if self.first_segment == 'exchangeRate':
+            self.update_rate(upsert=True)
+
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND, 'Ресурс не найден')
+
     def get_currencies(self) -> None:
-        if len(self.path_segments) == 1:
+        if len(self.path_segments) == 1 and self.is_page_request:
+            self.get_currencies_page()
+        elif len(self.path_segments) == 1:
             try:
-                data = self.service.get_currencies()
-                response = serialize(data)
-                self.send_json_response(HTTPStatus.OK, response)
+                self.send_data_response(
+                    self.service.get_currencies, cache_key='currencies'
+                )
             except NoDataBaseConnectionError as error:
                 self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
         else:
             self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
 
+    def get_currencies_page(self) -> None:
+        if not self.is_valid_page:
+            self.send_page_error()
+        else:
+            try:
+                cursor, limit = self.page_cursor, self.page_limit
+                self.send_data_response(
+                    lambda: self.service.get_currencies_page(cursor, limit)
+                )
+            except NoDataBaseConnectionError as error:
+                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
+
     def get_currency(self) -> None:
         if self.second_segment is None:
             self.send_error(HTTPStatus.BAD_REQUEST, 'Код валюты отсутствует в адресе')
@@ -92,9 +270,10 @@ class RequestHandler(BaseHTTPRequestHandler):
                 )
             else:
                 try:
-                    data = self.service.get_currency(cur_code)
-                    response = serialize(data)
-                    self.send_json_response(HTTPStatus.OK, response)
+                    self.send_data_response(
+                        lambda: self.service.get_currency(cur_code),
+                        cache_key=f'currency/{cur_code}',
+                    )
                 except NoDataBaseConnectionError as error:
                     self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
                 except NoCurrencyError as error:
@@ -103,16 +282,45 @@ class RequestHandler(BaseHTTPRequestHandler):
             self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
 
     def get_rates(self) -> None:
-        if len(self.path_segments) == 1:
+        if len(self.path_segments) == 1 and self.is_rates_page_request:
+            self.get_rates_page()
+        elif len(self.path_segments) == 1:
             try:
-                data = self.service.get_rates()
-                response = serialize(data)
-                self.send_json_response(HTTPStatus.OK, response)
+                self.send_data_response(
+                    self.service.get_rates, cache_key='exchangeRates'
+                )
             except NoDataBaseConnectionError as error:
                 self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
         else:
             self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
 
+    def get_rates_page(self) -> None:
+        base_cur_code = self.query_params.get('base')
+        target_cur_code = self.query_params.get('target')
+
+        if not self.is_valid_page:
+            self.send_page_error()
+        elif not all(
+            code is None or is_valid_cur_code(code)
+            for code in (base_cur_code, target_cur_code)
+        ):
+            self.send_error(
+                HTTPStatus.BAD_REQUEST,
+                'Код валюты должен состоять из 3 заглавных английских букв',
+            )
+        else:
+            try:
+                cursor, limit = self.page_cursor, self.page_limit
+                self.send_data_response(
+                    lambda: self.service.get_rates_page(
+                        cursor, limit, base_cur_code, target_cur_code
+                    )
+                )
+            except NoDataBaseConnectionError as error:
+                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
+            except NoCurrencyError as error:
+                self.send_error(HTTPStatus.NOT_FOUND, str(error))
+
     def get_rate(self) -> None:
         if self.second_segment is None:
             self.send_error(
@@ -135,11 +343,19 @@ class RequestHandler(BaseHTTPRequestHandler):
                     HTTPStatus.BAD_REQUEST,
                     'Нельзя получить обменный курс валюты на саму себя',
                 )
+            elif not self.is_valid_at:
+                self.send_error(
+                    HTTPStatus.BAD_REQUEST,
+                    'Момент времени at должен быть числом секунд Unix '
+                    'или датой и временем в формате ISO 8601',
+                )
             else:
                 try:
-                    data = self.service.get_rate(code_pair)
-                    response = serialize(data)
-                    self.send_json_response(HTTPStatus.OK, response)
+                    at = self.at
+                    self.send_data_response(
+                        lambda: self.service.get_rate(code_pair, at),
+                        cache_key=f'exchangeRate/{code_pair}' if at is None else None,
+                    )
                 except NoDataBaseConnectionError as error:
                     self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
                 except NoRateError as error:
@@ -147,6 +363,21 @@ class RequestHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
 
+    def get_metrics(self) -> None:
+        if len(self.path_segments) == 1:
+            body = metrics.render().encode('utf-8')
+            self.response = Response(
+                HTTPStatus.OK,
+                [
+                    ('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                    ('Content-Length', str(len(body))),
+                    ('Cache-Control', 'no-store'),
+                ],
+                body,
+            )
+        else:
+            self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
+
     def create_currency(self) -> None:
         if len(self.path_segments) == 1:
             cur_name = self.request_params.get('name')
@@ -252,7 +483,70 @@ class RequestHandler(BaseHTTPRequestHandler):
         else:
             self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
 
-    def update_rate(self) -> None:
+    def import_rates(self) -> None:
+        if len(self.path_segments) != 2:
+            self.send_error(HTTPStatus.NOT_FOUND, 'Ресурс не найден')
+            return
+
+        content_type = self.headers.get_content_type()
+        if content_type not in ('text/csv', 'application/json'):
+            self.send_error(
+                HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                'Курсы принимаются в формате text/csv или application/json',
+            )
+            return
+
+        items = self.import_items
+        if not items:
+            self.send_error(
+                HTTPStatus.BAD_REQUEST,
+                'Тело запроса должно содержать непустой список обменных курсов '
+                'с полями baseCurrencyCode, targetCurrencyCode и rate',
+            )
+        elif len(items) > MAX_IMPORT_SIZE:
+            self.send_error(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                f'В одном запросе допускается не более {MAX_IMPORT_SIZE} '
+                'обменных курсов',
+            )
+        else:
+            try:
+                with span('validate'):
+                    parsed_items = [
+                        self._parse_rate_item(row, item)
+                        for row, item in enumerate(items, start=1)
+                    ]
+                imported = iter(
+                    self.service.import_rates(
+                        [
+                            item
+                            for item in parsed_items
+                            if isinstance(item, RatePostUpdateDto)
+                        ]
+                    )
+                )
+                results = [
+                    self._import_result(row, next(imported))
+                    if isinstance(item, RatePostUpdateDto)
+                    else item
+                    for row, item in enumerate(parsed_items, start=1)
+                ]
+                statuses = [result.status for result in results]
+                data = RateImportDto(
+                    statuses.count(HTTPStatus.CREATED),
+                    statuses.count(HTTPStatus.OK),
+                    len(statuses)
+                    - statuses.count(HTTPStatus.CREATED)
+                    - statuses.count(HTTPStatus.OK),
+                    results,
+                )
+                response = serialize(data)
+                self.send_json_response(HTTPStatus.OK, response)
+            except NoDataBaseConnectionError as error:
+                self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
+
+    def update_rate(self, upsert: bool = False) -> None:
+        # PATCH updates an existing pair; PUT (`upsert`) also creates a new one.
         if self.second_segment is None:
             self.send_error(
                 HTTPStatus.BAD_REQUEST, 'Коды валют пары отсутствуют в адресе'
@@ -297,12 +591,18 @@ class RequestHandler(BaseHTTPRequestHandler):
                         rate_update_dto = RatePostUpdateDto(
                             code_pair[:3], code_pair[3:], exch_rate_dec_round
                         )
-                        data = self.service.update_rate(rate_update_dto)
+                        if upsert:
+                            data, created = self.service.put_rate(rate_update_dto)
+                        else:
+                            data = self.service.update_rate(rate_update_dto)
+                            created = False
                         response = serialize(data)
-                        self.send_json_response(HTTPStatus.OK, response)
+                        self.send_json_response(
+                            HTTPStatus.CREATED if created else HTTPStatus.OK, response
+                        )
                     except NoDataBaseConnectionError as error:
                         self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
-                    except NoRateError as error:
+                    except (NoRateError, NoCurrencyPairError) as error:
                         self.send_error(HTTPStatus.NOT_FOUND, str(error))
         else:
             self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
@@ -340,69 +640,225 @@ class RequestHandler(BaseHTTPRequestHandler):
                         'Нельзя произвести расчёт перевода средств '
                         'из одной валюты в саму себя',
                     )
+                elif not self.is_valid_at:
+                    self.send_error(
+                        HTTPStatus.BAD_REQUEST,
+                        'Момент времени at должен быть числом секунд Unix '
+                        'или датой и временем в формате ISO 8601',
+                    )
                 else:
                     try:
                         amount_dec = Decimal(normalized_amount)
                         exchange_post_dto = ExchangePostDto(
                             from_cur_code, to_cur_code, amount_dec
                         )
-                        data = self.service.exchange_currencies(exchange_post_dto)
-                        response = serialize(data)
-                        self.send_json_response(HTTPStatus.OK, response)
+                        at = self.at
+                        self.send_data_response(
+                            lambda: self.service.exchange_currencies(
+                                exchange_post_dto, at
+                            )
+                        )
                     except NoDataBaseConnectionError as error:
                         self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
                     except CantConvertError as error:
                         self.send_error(HTTPStatus.NOT_FOUND, str(error))
+                    except InvalidOperation:
+                        # Infinity, or an amount too large to round for the JSON.
+                        self.send_error(
+                            HTTPStatus.BAD_REQUEST,
+                            'Количество средств для рассчёта перевода слишком велико',
+                        )
+        elif len(self.path_segments) == 2 and self.second_segment == 'all':
+            self.exchange_to_all()
         else:
             self.send_error(HTTPStatus.BAD_REQUEST, 'Неправильный формат запроса')
 
-    def send_json_response(self, status_code: int, response: str) -> None:
-        body = response.encode('utf-8')
-        self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Content-Length', str(len(body)))
-        self.end_headers()
-        self.wfile.write(body)
+    def exchange_to_all(self) -> None:
+        from_cur_code = self.query_params.get('from')
+        amount_str = self.query_params.get('amount')
 
-    def send_error(
-        self, code: int, message: str | None = None, explain: str | None = None
+        if from_cur_code is None or amount_str is None:
+            self.send_error(
+                HTTPStatus.BAD_REQUEST,
+                'Отсутствует один или несколько нужных параметров запроса',
+            )
+        else:
+            normalized_amount = repl_dec_separator(amount_str)
+
+            if not is_valid_cur_code(from_cur_code):
+                self.send_error(
+                    HTTPStatus.BAD_REQUEST,
+                    'Код валюты должен состоять из 3 заглавных английских букв',
+                )
+            elif not is_positive_number(normalized_amount):
+                self.send_error(
+                    HTTPStatus.BAD_REQUEST,
+                    'Количество средств для рассчёта перевода должно быть '
+                    'положительным, целым или дробным числом',
+                )
+            else:
+                try:
+                    exchange_all_dto = ExchangeAllDto(
+                        from_cur_code, Decimal(normalized_amount)
+                    )
+                    self.send_data_response(
+                        lambda: self.service.exchange_to_all(exchange_all_dto)
+                    )
+                except NoDataBaseConnectionError as error:
+                    self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
+                except CantConvertError as error:
+                    self.send_error(HTTPStatus.NOT_FOUND, str(error))
+                except InvalidOperation:
+                    # Infinity, or an amount too large to round for the JSON.
+                    self.send_error(
+                        HTTPStatus.BAD_REQUEST,
+                        'Количество средств для рассчёта перевода слишком велико',
+                    )
+
+    def exchange_batch(self) -> None:
+        if len(self.path_segments) == 2 and self.second_segment == 'batch':
+            items = self.batch_items
+
+            if not items:
+                self.send_error(
+                    HTTPStatus.BAD_REQUEST,
+                    'Тело запроса должно содержать непустой список конвертаций',
+                )
+            elif len(items) > MAX_BATCH_SIZE:
+                self.send_error(
+                    HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                    f'В одном запросе допускается не более {MAX_BATCH_SIZE} '
+                    'конвертаций',
+                )
+            else:
+                try:
+                    with span('validate'):
+                        parsed_items = [
+                            self._parse_exchange_item(item) for item in items
+                        ]
+                    exchanged = iter(
+                        self.service.exchange_batch(
+                            [
+                                item
+                                for item in parsed_items
+                                if isinstance(item, ExchangePostDto)
+                            ]
+                        )
+                    )
+                    data = [
+                        self._batch_result(next(exchanged))
+                        if isinstance(item, ExchangePostDto)
+                        else item
+                        for item in parsed_items
+                    ]
+                    response = serialize(data)
+                    self.send_json_response(HTTPStatus.OK, response)
+                except NoDataBaseConnectionError as error:
+                    self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, str(error))
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND, 'Ресурс не найден')
+
+    def send_data_response(
+        self, load_data: Callable[[], Any], cache_key: str | None = None
     ) -> None:
-        try:
-            shortmsg, longmsg = self.responses[code]
-        except KeyError:
-            shortmsg, longmsg = '???', '???'
-
-        actual_status_message = shortmsg
-
-        if message is None:
-            message = shortmsg
-        if explain is None:
-            explain = longmsg
-        self.log_error('code %d, message %s', code, message)
-        self.send_response(code, actual_status_message)
-        self.send_header('Connection', 'close')
-
-        # Message body is omitted for cases described in:
-        #  - RFC7230: 3.3. 1xx, 204(No Content), 304(Not Modified)
-        #  - RFC7231: 6.3.6. 205(Reset Content)
-        body = None
-        if code >= 200 and code not in (
-            HTTPStatus.NO_CONTENT,
-            HTTPStatus.RESET_CONTENT,
-            HTTPStatus.NOT_MODIFIED,
-        ):
-            content = {'message': message}
-            body = json.dumps(content, ensure_ascii=False).encode('utf-8')
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.send_header('Content-Length', str(len(body)))
-        self.end_headers()
+        # The version is read before the data is loaded, so a write racing with
+        # the request can only make the ETag older than the body, never newer.
+        version = data_version.version
+        if version == UNKNOWN_VERSION:
+            headers: dict[str, str] = {}
+            data = self.load_page(load_data, headers)
+            self.send_json_response(HTTPStatus.OK, serialize(data), headers)
+            return
+        # Updates waiting for the write-behind writer are not in the data
+        # version yet; the rate book counts them in its generation. Only this
+        # process has them, and other prefork workers count their own, so the
+        # tag names the process: the same tag never stands for two bodies.
+        generation = self.context.rate_book.generation
+        etag = (
+            f'"{version}"'
+            if generation == 0
+            else f'"{version}.{os.getpid()}.{generation}"'
+        )
 
-        if self.command != 'HEAD' and body:
-            self.wfile.write(body)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if self.is_not_modified(etag, load_data):
+            self.response = Response(HTTPStatus.NOT_MODIFIED, list(headers.items()))
+        elif cache_key is None:
+            data = self.load_page(load_data, headers)
+            self.send_json_response(HTTPStatus.OK, serialize(data), headers)
+        else:
+            body = self.context.response_cache.get((version, generation), cache_key)
+            headers['X-Cache'] = 'MISS' if body is None else 'HIT'
+            metrics.inc(
+                'response_cache_requests_total', (('result', headers['X-Cache']),)
+            )
+            if body is None:
+                body = serialize(load_data()).encode('utf-8')
+                self.context.response_cache.put((version, generation), cache_key, body)
+            self.send_json_body(HTTPStatus.OK, body, headers)
 
-    @cached_property
-    def service(self) -> Service:
-        return Service()
+    def load_page(self, load_data: Callable[[], Any], headers: dict[str, str]) -> Any:
+        # A page goes out as a plain list, like the full collection; the
+        # cursor of the next page goes in the headers.
+        data = load_data()
+        if not isinstance(data, Page):
+            return data
+        if data.next_cursor is not None:
+            query = urlencode({**self.query_params, 'cursor': data.next_cursor})
+            headers['X-Next-Cursor'] = str(data.next_cursor)
+            headers['Link'] = f'<{self.parsed_path.path}?{query}>; rel="next"'
+        return data.items
+
+    def is_not_modified(self, etag: str, load_data: Callable[[], Any]) -> bool:
+        # There is no Last-Modified: the data version is a counter, and no
+        # stored time says when a resource changed, so If-Modified-Since is
+        # ignored.
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is None:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if etag in tags:
+            return True
+        # "*" matches only a resource that exists; loading a missing one
+        # raises its not-found error.
+        if '*' in tags:
+            load_data()
+            return True
+        return False
+
+    def send_json_response(
+        self,
+        status_code: int,
+        response: str,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.send_json_body(status_code, response.encode('utf-8'), headers)
+
+    def send_json_body(
+        self,
+        status_code: int,
+        body: bytes,
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        self.response = Response(
+            status_code,
+            [
+                ('Content-Type', 'application/json'),
+                ('Content-Length', str(len(body))),
+                *(headers or {}).items(),
+            ],
+            body,
+        )
+
+    def send_error(self, code: int, message: str | None = None) -> None:
+        self.response = error_response(code, message, self.command == 'HEAD')
+
+    def send_page_error(self) -> None:
+        self.send_error(
+            HTTPStatus.BAD_REQUEST,
+            f'Параметр limit должен быть целым числом от 1 до {MAX_PAGE_LIMIT}, '
+            'а cursor — неотрицательным целым числом',
+        )
 
     @cached_property
     def parsed_path(self) -> ParseResult:
@@ -425,10 +881,265 @@ class RequestHandler(BaseHTTPRequestHandler):
             return None
 
     @cached_property
+    def route(self) -> str:
+        # The path with codes replaced by placeholders, so that the metrics
+        # get one series per endpoint rather than per currency or pair.
+        segments = self.path_segments
+        if len(segments) == 1 and segments[0] in (
+            'currencies',
+            'currency',
+            'exchangeRates',
+            'exchangeRate',
+            'exchange',
+            'metrics',
+        ):
+            return f'/{segments[0]}'
+        if len(segments) == 2:
+            if segments[0] == 'currency':
+                return '/currency/{code}'
+            if segments[0] == 'exchangeRate':
+                return '/exchangeRate/{pair}'
+            if (segments[0], segments[1]) in (
+                ('exchangeRates', 'bulk'),
+                ('exchange', 'all'),
+                ('exchange', 'batch'),
+            ):
+                return f'/{segments[0]}/{segments[1]}'
+        return 'other'
+
+    @cached_property
+    @traced('parse')
     def request_params(self) -> dict[str, Any]:
-        data_string = self.rfile.read(int(self.headers.get('Content-Length', 0)))
-        return dict(parse_qsl(data_string.decode('utf-8')))
+        return dict(parse_qsl(self.request_body.decode('utf-8')))
+
+    @cached_property
+    @traced('parse')
+    def batch_items(self) -> list[dict[str, Any]] | None:
+        try:
+            if self.headers.get_content_type() == 'application/json':
+                payload = json.loads(self.request_body, parse_float=Decimal)
+                if isinstance(payload, dict):
+                    payload = payload.get('items')
+                if isinstance(payload, list) and all(
+                    isinstance(item, dict) for item in payload
+                ):
+                    return payload
+                return None
+
+            fields: dict[str, list[str]] = {'from': [], 'to': [], 'amount': []}
+            for key, value in parse_qsl(
+                self.request_body.decode('utf-8'), keep_blank_values=True
+            ):
+                if key in fields:
+                    fields[key].append(value)
+        except ValueError:
+            return None
+
+        if len({len(values) for values in fields.values()}) != 1:
+            return None
+        return [
+            {'from': from_cur_code, 'to': to_cur_code, 'amount': amount}
+            for from_cur_code, to_cur_code, amount in zip(
+                fields['from'], fields['to'], fields['amount'], strict=True
+            )
+        ]
 
     @cached_property
+    @traced('parse')
+    def import_items(self) -> list[dict[str, Any]] | None:
+        try:
+            if self.headers.get_content_type() == 'text/csv':
+                reader = csv.DictReader(
+                    self.request_body.decode('utf-8-sig').splitlines()
+                )
+                if reader.fieldnames is None or not {
+                    'baseCurrencyCode',
+                    'targetCurrencyCode',
+                    'rate',
+                } <= set(reader.fieldnames):
+                    return None
+                return list(reader)
+
+            payload = json.loads(self.request_body, parse_float=Decimal)
+        except (ValueError, csv.Error):
+            return None
+
+        if isinstance(payload, dict):
+            payload = payload.get('items')
+        if isinstance(payload, list) and all(
+            isinstance(item, dict) for item in payload
+        ):
+            return payload
+        return None
+
+    def _parse_rate_item(
+        self, row: int, item: dict[str, Any]
+    ) -> RatePostUpdateDto | RateImportItemDto:
+        base_cur_code = item.get('baseCurrencyCode')
+        target_cur_code = item.get('targetCurrencyCode')
+        exch_rate = item.get('rate')
+
+        if base_cur_code is None or target_cur_code is None or exch_rate is None:
+            return RateImportItemDto(
+                row, HTTPStatus.BAD_REQUEST, 'Отсутствует нужное поле обменного курса'
+            )
+
+        normalized_rate = repl_dec_separator(str(exch_rate))
+
+        if not (
+            isinstance(base_cur_code, str)
+            and isinstance(target_cur_code, str)
+            and is_valid_cur_code(base_cur_code)
+            and is_valid_cur_code(target_cur_code)
+        ):
+            return RateImportItemDto(
+                row,
+                HTTPStatus.BAD_REQUEST,
+                'Код валюты должен состоять из 3 заглавных английских букв',
+            )
+        if base_cur_code == target_cur_code:
+            return RateImportItemDto(
+                row,
+                HTTPStatus.BAD_REQUEST,
+                'Нельзя добавить обменный курс валюты на саму себя',
+            )
+        rate_error = RateImportItemDto(
+            row,
+            HTTPStatus.BAD_REQUEST,
+            'Обменный курс должен быть положительным, целым или дробным числом',
+        )
+        if isinstance(exch_rate, bool) or not is_positive_number(normalized_rate):
+            return rate_error
+        try:
+            exch_rate_dec_round = round_decimal(
+                Decimal(normalized_rate), NUMBER_OF_DECIMAL_PLACES_FOR_RATES
+            )
+        except InvalidOperation:
+            # Infinity, or too many digits to keep six of them after the point.
+            return rate_error
+        return RatePostUpdateDto(base_cur_code, target_cur_code, exch_rate_dec_round)
+
+    def _import_result(
+        self, row: int, result: ImportedRate | NoCurrencyPairError
+    ) -> RateImportItemDto:
+        if isinstance(result, NoCurrencyPairError):
+            return RateImportItemDto(row, HTTPStatus.NOT_FOUND, str(result))
+        if result.created:
+            return RateImportItemDto(row, HTTPStatus.CREATED, 'Обменный курс добавлен')
+        return RateImportItemDto(row, HTTPStatus.OK, 'Обменный курс обновлён')
+
+    def _parse_exchange_item(
+        self, item: dict[str, Any]
+    ) -> ExchangePostDto | BatchItemErrorDto:
+        from_cur_code = item.get('from')
+        to_cur_code = item.get('to')
+        amount = item.get('amount')
+
+        if from_cur_code is None or to_cur_code is None or amount is None:
+            return BatchItemErrorDto(
+                HTTPStatus.BAD_REQUEST,
+                'Отсутствует одно или несколько нужных полей конвертации',
+            )
+
+        normalized_amount = repl_dec_separator(str(amount))
+
+        if not (
+            isinstance(from_cur_code, str)
+            and isinstance(to_cur_code, str)
+            and is_valid_cur_code(from_cur_code)
+            and is_valid_cur_code(to_cur_code)
+        ):
+            return BatchItemErrorDto(
+                HTTPStatus.BAD_REQUEST,
+                'Код валюты должен состоять из 3 заглавных английских букв',
+            )
+        if isinstance(amount, bool) or not is_positive_number(normalized_amount):
+            return BatchItemErrorDto(
+                HTTPStatus.BAD_REQUEST,
+                'Количество средств для рассчёта перевода должно быть '
+                'положительным, целым или дробным числом',
+            )
+        try:
+            amount_dec = Decimal(normalized_amount)
+            round_decimal(amount_dec, NUMBER_OF_DECIMAL_PLACES_FOR_JSON)
+        except InvalidOperation:
+            # Infinity, or too many digits to keep two of them after the point.
+            return BatchItemErrorDto(
+                HTTPStatus.BAD_REQUEST,
+                'Количество средств для рассчёта перевода слишком велико',
+            )
+        if from_cur_code == to_cur_code:
+            return BatchItemErrorDto(
+                HTTPStatus.BAD_REQUEST,
+                'Нельзя произвести расчёт перевода средств из одной валюты в саму себя',
+            )
+        return ExchangePostDto(from_cur_code, to_cur_code, amount_dec)
+
+    def _batch_result(
+        self, result: ExchangeDto | CantConvertError
+    ) -> ExchangeDto | BatchItemErrorDto:
+        if isinstance(result, CantConvertError):
+            return BatchItemErrorDto(HTTPStatus.NOT_FOUND, str(result))
+        try:
+            # The same rounding as in the JSON, checked per item so that one
+            # huge amount fails alone rather than the whole batch.
+            round_decimal(result.converted_amount, NUMBER_OF_DECIMAL_PLACES_FOR_JSON)
+        except InvalidOperation:
+            return BatchItemErrorDto(
+                HTTPStatus.BAD_REQUEST, 'Сумма перевода слишком велика'
+            )
+        return result
+
+    @cached_property
+    @traced('parse')
     def query_params(self) -> dict[str, str]:
         return dict(parse_qsl(self.parsed_path.query))
+
+    @cached_property
+    def is_valid_at(self) -> bool:
+        at = self.query_params.get('at')
+        return at is None or is_valid_timestamp(at)
+
+    @cached_property
+    def at(self) -> float | None:
+        at = self.query_params.get('at')
+        return None if at is None else to_timestamp(at)
+
+    @cached_property
+    def is_page_request(self) -> bool:
+        return 'limit' in self.query_params or 'cursor' in self.query_params
+
+    @cached_property
+    def is_rates_page_request(self) -> bool:
+        # The rate list is also paged when it is filtered by currency.
+        return (
+            self.is_page_request
+            or 'base' in self.query_params
+            or 'target' in self.query_params
+        )
+
+    @cached_property
+    def is_valid_page(self) -> bool:
+        limit = self.query_params.get('limit')
+        cursor = self.query_params.get('cursor')
+        return (limit is None or is_int_in_range(limit, 1, MAX_PAGE_LIMIT)) and (
+            cursor is None or is_int_in_range(cursor, 0, MAX_PAGE_CURSOR)
+        )
+
+    @cached_property
+    def page_limit(self) -> int:
+        return int(self.query_params.get('limit', DEFAULT_PAGE_LIMIT))
+
+    @cached_property
+    def page_cursor(self) -> int:
+        return int(self.query_params.get('cursor', 0))
+
+    @cached_property
+    def reads_rate_book_only(self) -> bool:
+        # GET requests are answered from the rate book, except the point-in-time
+        # ones, which read the rate history from the database, and the pages.
+        return (
+            self.command == 'GET'
+            and 'at' not in self.query_params
+            and not self.is_rates_page_request
+        )
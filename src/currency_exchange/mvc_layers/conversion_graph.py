@@ -0,0 +1,214 @@
+from bisect import insort
+from collections import deque
+from copy import copy
+from decimal import Decimal
+
+from currency_exchange.models import Rate
+
+# A conversion factor kept as numerator and denominator, so that a path is
+# divided only once: 1 / r for an inverse quote and r2 / r1 for a cross rate
+# come out exactly as if computed by hand.
+Term = tuple[Decimal, Decimal]
+
+ONE = Decimal(1)
+NO_PARENT = -1
+UNREACHABLE = -1
+
+
+class ConversionGraph:
+    # Currencies are nodes, a quote in either direction is an edge. For every
+    # source a BFS tree of fewest-hop paths is kept, and the resulting rates are
+    # stored in a dense matrix indexed by currency position, so any lookup is
+    # two dict hits and two list indexings. Among equally short paths the hub
+    # currency (index 0) is preferred, which keeps the old USD cross rate.
+    #
+    # Readers use a graph without a lock, so a published graph is never
+    # changed: updates go to a copy(), which shares the rows with the
+    # original, and every update replaces the rows it changes instead of
+    # changing them in place.
+    def __init__(
+        self, currency_ids: list[int], rates: list[Rate], hub_id: int | None = None
+    ) -> None:
+        ids = [hub_id] if hub_id is not None and hub_id in currency_ids else []
+        ids.extend(cur_id for cur_id in dict.fromkeys(currency_ids) if cur_id != hub_id)
+        size = len(ids)
+        self.ids: list[int] = ids
+        self.index: dict[int, int] = {cur_id: pos for pos, cur_id in enumerate(ids)}
+        self.quotes: list[list[Decimal | None]] = [[None] * size for _ in ids]
+        self.neighbours: list[list[int]] = [[] for _ in ids]
+        self.parents: list[list[int]] = [[] for _ in ids]
+        self.depths: list[list[int]] = [[] for _ in ids]
+        self.orders: list[list[int]] = [[] for _ in ids]
+        self.matrix: list[list[Decimal | None]] = [[] for _ in ids]
+
+        # The rows are not shared yet, so they are filled in place.
+        for rate in rates:
+            base = self.index[rate.base_id]
+            target = self.index[rate.target_id]
+            if self._edge_term(base, target) is None:
+                self.neighbours[base].append(target)
+                self.neighbours[target].append(base)
+            self.quotes[base][target] = rate.rate
+        for neighbours in self.neighbours:
+            neighbours.sort()
+        for source in range(size):
+            self._search(source)
+
+    def copy(self) -> 'ConversionGraph':
+        graph = copy(self)
+        graph.ids = self.ids.copy()
+        graph.index = self.index.copy()
+        graph.quotes = self.quotes.copy()
+        graph.neighbours = self.neighbours.copy()
+        graph.parents = self.parents.copy()
+        graph.depths = self.depths.copy()
+        graph.orders = self.orders.copy()
+        graph.matrix = self.matrix.copy()
+        return graph
+
+    def rate(self, from_id: int, to_id: int) -> Decimal | None:
+        try:
+            return self.matrix[self.index[from_id]][self.index[to_id]]
+        except KeyError:
+            return None
+
+    def row(self, from_id: int) -> list[tuple[int, Decimal]]:
+        if from_id not in self.index:
+            return []
+        source_row = self.matrix[self.index[from_id]]
+        return sorted(
+            (cur_id, rate)
+            for cur_id, rate in zip(self.ids, source_row, strict=True)
+            if rate is not None and cur_id != from_id
+        )
+
+    def add_currency(self, cur_id: int) -> None:
+        if cur_id not in self.index:
+            self._add_node(cur_id)
+            self._search(len(self.ids) - 1)
+
+    def set_rate(self, rate: Rate) -> None:
+        self.add_currency(rate.base_id)
+        self.add_currency(rate.target_id)
+        base = self.index[rate.base_id]
+        target = self.index[rate.target_id]
+        is_new_edge = self._edge_term(base, target) is None
+        self._add_quote(rate)
+
+        for source in range(len(self.ids)):
+            if is_new_edge:
+                if self._changes_tree(source, base, target):
+                    self._search(source)
+            elif (
+                self.parents[source][target] == base
+                or self.parents[source][base] == target
+            ):
+                self._fill(source)
+
+    def _changes_tree(self, source: int, base: int, target: int) -> bool:
+        # Whether a search from scratch would build a different tree once the
+        # new edge is added, so that a patched graph always equals a rebuilt
+        # one. The edge matters if it shortens a path to one of its ends, or
+        # if it offers the deeper end a parent that the search reaches before
+        # the current one: among equally short paths the first found wins,
+        # which is how the hub is preferred.
+        depths = self.depths[source]
+        base_depth, target_depth = depths[base], depths[target]
+        if base_depth == UNREACHABLE or target_depth == UNREACHABLE:
+            return base_depth != target_depth
+        if abs(base_depth - target_depth) != 1:
+            return abs(base_depth - target_depth) > 1
+        upper, lower = (base, target) if base_depth < target_depth else (target, base)
+        order = self.orders[source]
+        return order.index(upper) < order.index(self.parents[source][lower])
+
+    def set_rates(self, rates: list[Rate]) -> None:
+        # Past a point, redoing every search once is cheaper than updating the
+        # trees after each rate.
+        if len(rates) <= len(self.ids):
+            for rate in rates:
+                self.set_rate(rate)
+            return
+        for rate in rates:
+            self.add_currency(rate.base_id)
+            self.add_currency(rate.target_id)
+            self._add_quote(rate)
+        for source in range(len(self.ids)):
+            self._search(source)
+
+    def _add_node(self, cur_id: int) -> None:
+        position = len(self.ids)
+        self.ids.append(cur_id)
+        self.index[cur_id] = position
+        for source in range(position):
+            self.quotes[source] = [*self.quotes[source], None]
+            self.parents[source] = [*self.parents[source], NO_PARENT]
+            self.depths[source] = [*self.depths[source], UNREACHABLE]
+            self.matrix[source] = [*self.matrix[source], None]
+        self.quotes.append([None] * (position + 1))
+        self.parents.append([NO_PARENT] * (position + 1))
+        self.depths.append([UNREACHABLE] * (position + 1))
+        self.matrix.append([None] * (position + 1))
+        self.neighbours.append([])
+        self.orders.append([])
+
+    def _add_quote(self, rate: Rate) -> None:
+        base = self.index[rate.base_id]
+        target = self.index[rate.target_id]
+        if self._edge_term(base, target) is None:
+            for node, neighbour in ((base, target), (target, base)):
+                neighbours = self.neighbours[node].copy()
+                insort(neighbours, neighbour)
+                self.neighbours[node] = neighbours
+        quotes = self.quotes[base].copy()
+        quotes[target] = rate.rate
+        self.quotes[base] = quotes
+
+    def _edge_term(self, from_pos: int, to_pos: int) -> Term | None:
+        direct = self.quotes[from_pos][to_pos]
+        if direct is not None:
+            return direct, ONE
+        inverse = self.quotes[to_pos][from_pos]
+        if inverse is not None:
+            return ONE, inverse
+        return None
+
+    def _search(self, source: int) -> None:
+        size = len(self.ids)
+        parents = [NO_PARENT] * size
+        depths = [UNREACHABLE] * size
+        depths[source] = 0
+        order = [source]
+        queue = deque(order)
+        while queue and len(order) < size:
+            node = queue.popleft()
+            for neighbour in self.neighbours[node]:
+                if depths[neighbour] == UNREACHABLE:
+                    depths[neighbour] = depths[node] + 1
+                    parents[neighbour] = node
+                    order.append(neighbour)
+                    queue.append(neighbour)
+
+        self.parents[source] = parents
+        self.depths[source] = depths
+        self.orders[source] = order
+        self._fill(source)
+
+    def _fill(self, source: int) -> None:
+        size = len(self.ids)
+        terms: list[Term | None] = [None] * size
+        matrix: list[Decimal | None] = [None] * size
+        parents = self.parents[source]
+        terms[source] = (ONE, ONE)
+        matrix[source] = ONE
+        for node in self.orders[source][1:]:
+            parent = parents[node]
+            parent_term = terms[parent]
+            edge_term = self._edge_term(parent, node)
+            if parent_term is None or edge_term is None:
+                continue
+            numerator = parent_term[0] * edge_term[0]
+            denominator = parent_term[1] * edge_term[1]
+            terms[node] = (numerator, denominator)
+            matrix[node] = numerator / denominator
+        self.matrix[source] = matrix
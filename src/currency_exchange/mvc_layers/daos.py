@@ -1,19 +1,35 @@
-from sqlite3 import Cursor, IntegrityError, OperationalError, connect
+from sqlite3 import Cursor, IntegrityError, OperationalError
+from time import perf_counter
 from typing import Any
 
 from currency_exchange.constants import (
+    BEGIN_IMMEDIATE_SQL,
+    BUMP_DATA_VERSION_SQL,
+    CLEAR_IMPORT_PAIRS_SQL,
     CREATE_CURRENCY_SQL,
     CREATE_EXCHANGE_RATE_SQL,
-    DB_PATH,
+    CREATE_IMPORT_PAIRS_TABLE_SQL,
+    GET_CURRENCIES_PAGE_SQL,
     GET_CURRENCIES_SQL,
     GET_CURRENCY_BY_CODE_SQL,
     GET_CURRENCY_BY_ID_SQL,
+    GET_DATA_VERSION_SQL,
+    GET_EXCHANGE_RATE_AT_SQL,
     GET_EXCHANGE_RATE_SQL,
-    GET_EXCHANGE_RATES_SQL,
-    GET_LAST_CREATED_ID_SQL,
-    GET_LAST_UPDATED_ID_SQL,
+    GET_EXCHANGE_RATES_PAGE_BY_BASE_SQL,
+    GET_EXCHANGE_RATES_PAGE_BY_PAIR_SQL,
+    GET_EXCHANGE_RATES_PAGE_BY_TARGET_SQL,
+    GET_EXCHANGE_RATES_PAGE_SQL,
+    GET_EXCHANGE_RATES_WITH_CURRENCIES_SQL,
+    GET_IMPORT_PAIR_IDS_SQL,
+    INSERT_INTO_IMPORT_PAIRS_SQL,
+    PUT_EXCHANGE_RATE_SQL,
     UPDATE_EXCHANGE_RATE_SQL,
+    UPDATE_EXCHANGE_RATES_SQL,
+    UPSERT_EXCHANGE_RATE_SQL,
 )
+from currency_exchange.db.data_version import data_version
+from currency_exchange.db.pool import pool
 from currency_exchange.exceptions import (
     CurrencyAlreadyExistsError,
     NoCurrencyError,
@@ -21,28 +37,69 @@ from currency_exchange.exceptions import (
     NoRateError,
     RateAlreadyExistsError,
 )
+from currency_exchange.metrics import metrics
+from currency_exchange.tracing import traced
 
 
 class Dao:
-    def interact_with_db(self, queries: dict[str, Any], all: bool = False) -> Any:
-        with connect(str(DB_PATH)) as conn:
-            cur = conn.cursor()
-            for sql, params in queries.items():
-                self._execute(cur, sql, params)
-        return cur.fetchall() if all else cur.fetchone()
+    @traced('db')
+    def interact_with_db(
+        self, queries: dict[str, Any], all: bool = False, write: bool = False
+    ) -> Any:
+        started = perf_counter()
+        statements = len(queries)
+        try:
+            conn = pool.connection()
+            with conn:
+                cur = conn.cursor()
+                for sql, params in queries.items():
+                    self._execute(cur, sql, params)
+                query_result = cur.fetchall() if all else cur.fetchone()
+                # A write that matched nothing (e.g. updating a missing pair)
+                # leaves the data version alone.
+                version = None
+                if write and query_result is not None:
+                    version = self._bump_data_version(cur)
+                    statements += 1
+        finally:
+            self._record(statements, started)
+        if version is not None:
+            data_version.publish(version)
+        return query_result
 
     def _execute(self, cur: Cursor, sql: str, params: tuple[Any] | None) -> None:
         cur.execute(sql, params) if params is not None else cur.execute(sql)
 
+    def _bump_data_version(self, cur: Cursor) -> int:
+        return cur.execute(BUMP_DATA_VERSION_SQL).fetchone()[0]
+
+    def _record(self, statements: int, started: float) -> None:
+        labels = (('dao', type(self).__name__),)
+        metrics.inc('db_queries_total', labels, statements)
+        metrics.observe(
+            'db_transaction_duration_seconds', labels, perf_counter() - started
+        )
+
+
+class DataVersionDao(Dao):
+    def retrieve_one(self) -> int:
+        queries = {
+            GET_DATA_VERSION_SQL: None,
+        }
+        try:
+            query_result = self.interact_with_db(queries)
+            return query_result[0]
+        except OperationalError:
+            raise NoDataBaseConnectionError('База данных недоступна')
+
 
 class CurrencyDao(Dao):
     def create_one(self, code: str, name: str, sign: str) -> int:
         queries = {
             CREATE_CURRENCY_SQL: (code, name, sign),
-            GET_LAST_CREATED_ID_SQL: None,
         }
         try:
-            query_result = self.interact_with_db(queries)
+            query_result = self.interact_with_db(queries, write=True)
             return query_result[0]
         except OperationalError:
             raise NoDataBaseConnectionError('База данных недоступна')
@@ -59,6 +116,18 @@ class CurrencyDao(Dao):
         except OperationalError:
             raise NoDataBaseConnectionError('База данных недоступна')
 
+    def retrieve_page(
+        self, after_id: int, limit: int
+    ) -> list[tuple[int, str, str, str]]:
+        queries = {
+            GET_CURRENCIES_PAGE_SQL: (after_id, limit),
+        }
+        try:
+            query_result = self.interact_with_db(queries, all=True)
+            return query_result
+        except OperationalError:
+            raise NoDataBaseConnectionError('База данных недоступна')
+
     def retrieve_one_by_code(self, cur_code: str) -> tuple[int, str, str]:
         queries = {
             GET_CURRENCY_BY_CODE_SQL: (cur_code,),
@@ -88,19 +157,45 @@ class RateDao(Dao):
     def create_one(self, base_id: int, target_id: int, rate: str) -> int:
         queries = {
             CREATE_EXCHANGE_RATE_SQL: (base_id, target_id, rate),
-            GET_LAST_CREATED_ID_SQL: None,
         }
         try:
-            query_result = self.interact_with_db(queries)
+            query_result = self.interact_with_db(queries, write=True)
             return query_result[0]
         except OperationalError:
             raise NoDataBaseConnectionError('База данных недоступна')
         except IntegrityError:
             raise RateAlreadyExistsError('Валютная пара с таким кодом уже существует')
 
-    def retrieve_all(self) -> list[tuple[int, int, int, str]]:
+    def retrieve_all_with_currencies(
+        self,
+    ) -> list[tuple[int, str, int, str, str, str, int, str, str, str]]:
+        queries = {
+            GET_EXCHANGE_RATES_WITH_CURRENCIES_SQL: None,
+        }
+        try:
+            query_result = self.interact_with_db(queries, all=True)
+            return query_result
+        except OperationalError:
+            raise NoDataBaseConnectionError('База данных недоступна')
+
+    def retrieve_page_with_currencies(
+        self,
+        after_id: int,
+        limit: int,
+        base_currency_id: int | None = None,
+        target_currency_id: int | None = None,
+    ) -> list[tuple[int, str, int, str, str, str, int, str, str, str]]:
+        if base_currency_id is not None and target_currency_id is not None:
+            sql = GET_EXCHANGE_RATES_PAGE_BY_PAIR_SQL
+            params: tuple[int, ...] = (base_currency_id, target_currency_id)
+        elif base_currency_id is not None:
+            sql, params = GET_EXCHANGE_RATES_PAGE_BY_BASE_SQL, (base_currency_id,)
+        elif target_currency_id is not None:
+            sql, params = GET_EXCHANGE_RATES_PAGE_BY_TARGET_SQL, (target_currency_id,)
+        else:
+            sql, params = GET_EXCHANGE_RATES_PAGE_SQL, ()
         queries = {
-            GET_EXCHANGE_RATES_SQL: None,
+            sql: (*params, after_id, limit),
         }
         try:
             query_result = self.interact_with_db(queries, all=True)
@@ -122,15 +217,98 @@ class RateDao(Dao):
         except OperationalError:
             raise NoDataBaseConnectionError('База данных недоступна')
 
+    def retrieve_one_at(
+        self, base_currency_id: int, target_currency_id: int, at: float
+    ) -> tuple[int, str]:
+        queries = {
+            GET_EXCHANGE_RATE_AT_SQL: (base_currency_id, target_currency_id, at),
+        }
+        try:
+            query_result = self.interact_with_db(queries)
+            if query_result is None:
+                raise NoRateError(
+                    'Обменный курс для пары на указанный момент не найден'
+                )
+            return query_result
+        except OperationalError:
+            raise NoDataBaseConnectionError('База данных недоступна')
+
     def update_one(self, base_id: int, target_id: int, rate: str) -> int:
         queries = {
             UPDATE_EXCHANGE_RATE_SQL: (rate, base_id, target_id),
-            GET_LAST_UPDATED_ID_SQL: (base_id, target_id),
         }
         try:
-            query_result = self.interact_with_db(queries)
+            query_result = self.interact_with_db(queries, write=True)
             if query_result is None:
                 raise NoRateError('Валютная пара отсутствует в базе данных')
             return query_result[0]
         except OperationalError:
             raise NoDataBaseConnectionError('База данных недоступна')
+
+    def upsert_one(self, base_id: int, target_id: int, rate: str) -> int:
+        queries = {
+            PUT_EXCHANGE_RATE_SQL: (base_id, target_id, rate),
+        }
+        try:
+            query_result = self.interact_with_db(queries, write=True)
+            return query_result[0]
+        except OperationalError:
+            raise NoDataBaseConnectionError('База данных недоступна')
+
+    def update_many(self, rates: list[tuple[str, float, int, int]]) -> int:
+        # Returns how many of the rates were written; the others had been
+        # written later than they were acknowledged.
+        started = perf_counter()
+        try:
+            conn = pool.connection()
+            with conn:
+                cur = conn.cursor()
+                cur.execute(BEGIN_IMMEDIATE_SQL)
+                cur.executemany(UPDATE_EXCHANGE_RATES_SQL, rates)
+                written = cur.rowcount
+                version = self._bump_data_version(cur)
+            data_version.publish(version)
+            return written
+        except OperationalError:
+            raise NoDataBaseConnectionError('База данных недоступна')
+        finally:
+            # Each row of an executemany counts as a statement.
+            self._record(len(rates) + 2, started)
+
+    @traced('db')
+    def upsert_many(
+        self, rates: list[tuple[int, int, str]]
+    ) -> tuple[set[tuple[int, int]], dict[tuple[int, int], int]]:
+        # Returns which of the imported pairs existed before the write and the
+        # ids of all of them after it, read in the same transaction.
+        started = perf_counter()
+        try:
+            conn = pool.connection()
+            with conn:
+                cur = conn.cursor()
+                cur.execute(BEGIN_IMMEDIATE_SQL)
+                cur.execute(CREATE_IMPORT_PAIRS_TABLE_SQL)
+                cur.executemany(
+                    INSERT_INTO_IMPORT_PAIRS_SQL,
+                    [(base_id, target_id) for base_id, target_id, _ in rates],
+                )
+                existing_pairs = {
+                    (base_id, target_id)
+                    for base_id, target_id, _ in cur.execute(GET_IMPORT_PAIR_IDS_SQL)
+                }
+                cur.executemany(UPSERT_EXCHANGE_RATE_SQL, rates)
+                ids = {
+                    (base_id, target_id): rate_id
+                    for base_id, target_id, rate_id in cur.execute(
+                        GET_IMPORT_PAIR_IDS_SQL
+                    )
+                }
+                cur.execute(CLEAR_IMPORT_PAIRS_SQL)
+                version = self._bump_data_version(cur)
+            data_version.publish(version)
+            return existing_pairs, ids
+        except OperationalError:
+            raise NoDataBaseConnectionError('База данных недоступна')
+        finally:
+            # Each row of an executemany counts as a statement.
+            self._record(2 * len(rates) + 6, started)
@@ -0,0 +1,265 @@
+from collections.abc import Callable
+from copy import copy
+from decimal import Decimal
+from threading import RLock
+from time import monotonic, time
+from typing import Any
+
+from currency_exchange.constants import EXCHANGE_RATE_HELPER_CUR_CODE, RATE_BOOK_TTL
+from currency_exchange.db.data_version import data_version
+from currency_exchange.exceptions import NoCurrencyError, NoRateError
+from currency_exchange.models import Currency, Rate
+from currency_exchange.mvc_layers.conversion_graph import ConversionGraph
+from currency_exchange.mvc_layers.repository import RateWithCurrencies, Repository
+from currency_exchange.tracing import span
+
+
+class RateBookSnapshot:
+    def __init__(
+        self,
+        version: int,
+        currencies: list[Currency],
+        rates: list[RateWithCurrencies],
+        repository: Repository,
+    ) -> None:
+        self.version = version
+        self.loaded_at = monotonic()
+        self.repository = repository
+        self.stale = False
+        self.missing: dict[str | int, str] = {}
+        self.currencies_by_code = {currency.code: currency for currency in currencies}
+        self.currencies_by_id = {currency.id: currency for currency in currencies}
+        self.rates = {(rate.base_id, rate.target_id): rate for rate, _, _ in rates}
+        hub = self.currencies_by_code.get(EXCHANGE_RATE_HELPER_CUR_CODE)
+        self.graph = ConversionGraph(
+            [currency.id for currency in currencies if currency.id is not None],
+            list(self.rates.values()),
+            hub.id if hub is not None else None,
+        )
+
+    def copy(self) -> 'RateBookSnapshot':
+        snapshot = copy(self)
+        snapshot.missing = self.missing.copy()
+        snapshot.currencies_by_code = self.currencies_by_code.copy()
+        snapshot.currencies_by_id = self.currencies_by_id.copy()
+        snapshot.rates = self.rates.copy()
+        snapshot.graph = self.graph.copy()
+        return snapshot
+
+    def get_currencies(self) -> list[Currency]:
+        return list(self.currencies_by_code.values())
+
+    def get_currency(self, cur_code: str) -> Currency:
+        currency = self.currencies_by_code.get(cur_code)
+        if currency is None:
+            return self._look_up(cur_code, self.repository.get_currency)
+        return currency
+
+    def get_currency_by_id(self, cur_id: int) -> Currency:
+        currency = self.currencies_by_id.get(cur_id)
+        if currency is None:
+            return self._look_up(cur_id, self.repository.get_currency_by_id)
+        return currency
+
+    def get_rates(self) -> list[RateWithCurrencies]:
+        return [
+            RateWithCurrencies(
+                rate,
+                self.currencies_by_id[rate.base_id],
+                self.currencies_by_id[rate.target_id],
+            )
+            for rate in list(self.rates.values())
+        ]
+
+    def get_rate(self, base_currency_id: int, target_currency_id: int) -> Rate:
+        try:
+            return self.rates[(base_currency_id, target_currency_id)]
+        except KeyError:
+            raise NoRateError('Обменный курс для пары не найден')
+
+    def get_cross_rate(self, from_currency_id: int, to_currency_id: int) -> Decimal:
+        rate = self.graph.rate(from_currency_id, to_currency_id)
+        if rate is None:
+            raise NoRateError('Нет цепочки курсов между валютами')
+        return rate
+
+    def get_cross_rates(self, from_currency_id: int) -> list[tuple[Currency, Decimal]]:
+        return [
+            (self.currencies_by_id[cur_id], rate)
+            for cur_id, rate in self.graph.row(from_currency_id)
+        ]
+
+    def _look_up(self, key: str | int, load: Callable[[Any], Currency]) -> Currency:
+        # A currency the snapshot does not know is looked for in the database
+        # once per snapshot, as it may have been added bypassing the DAOs. If
+        # it is there, the snapshot is marked stale and the next request
+        # reloads it; if not, the miss is remembered.
+        message = self.missing.get(key)
+        if message is not None:
+            raise NoCurrencyError(message)
+        try:
+            currency = load(key)
+        except NoCurrencyError as error:
+            self.missing[key] = str(error)
+            raise
+        self.stale = True
+        return currency
+
+
+class RateBook:
+    # Every DAO write bumps DataVersion in the same transaction and publishes
+    # the new value to shared memory, so comparing against `data_version` tells
+    # whether the snapshot is still current, whichever worker wrote, without a
+    # query. In-process writers hold `lock` around the database write and the
+    # in-memory update and patch the snapshot instead of reloading it. Readers
+    # take no lock, so a patch goes to a copy of the snapshot, which replaces
+    # the published one in a single assignment. The TTL picks up edits that
+    # bypass the DAOs (create_db, manual SQL).
+    #
+    # Rate updates acknowledged before they are written (write-behind) wait in
+    # `pending`: they are patched into the snapshot at once and again after
+    # every reload, until flush_pending() writes them. `generation` counts
+    # them, so ETags and cached responses change before the data version does.
+    # `acknowledged_at` keeps the time of each, so that the flush can leave a
+    # pair alone that another process has written since.
+    def __init__(self, repository: Repository, ttl: float = RATE_BOOK_TTL) -> None:
+        self.repository = repository
+        self.ttl = ttl
+        self.lock = RLock()
+        self.pending: dict[tuple[int, int], Rate] = {}
+        self.acknowledged_at: dict[tuple[int, int], float] = {}
+        self.generation = 0
+        self._snapshot: RateBookSnapshot | None = None
+
+    def current(self) -> RateBookSnapshot:
+        version = data_version.version
+        snapshot = self._snapshot
+        if snapshot is None or not self._is_fresh(snapshot, version):
+            with self.lock:
+                snapshot = self._snapshot
+                if snapshot is None or not self._is_fresh(snapshot, version):
+                    # The version is read before the data: if a write slips in
+                    # between, the snapshot is labelled older than it is and is
+                    # merely reloaded once more.
+                    with span('rate_book_load'):
+                        loaded_version = self.repository.get_data_version()
+                        snapshot = RateBookSnapshot(
+                            loaded_version,
+                            self.repository.get_currencies(),
+                            self.repository.get_rates_with_currencies(),
+                            self.repository,
+                        )
+                        if self.pending:
+                            pending = list(self.pending.values())
+                            for rate in pending:
+                                snapshot.rates[(rate.base_id, rate.target_id)] = rate
+                            snapshot.graph.set_rates(pending)
+                    self._snapshot = snapshot
+                    data_version.publish(loaded_version)
+        return snapshot
+
+    def is_current(self) -> bool:
+        snapshot = self._snapshot
+        return snapshot is not None and self._is_fresh(snapshot, data_version.version)
+
+    def sync_version(self) -> None:
+        data_version.publish(self.repository.get_data_version())
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self._snapshot = None
+
+    def put_currency(self, currency: Currency) -> None:
+        with self.lock:
+            snapshot = self._patchable_snapshot()
+            if snapshot is not None:
+                snapshot = snapshot.copy()
+                snapshot.currencies_by_id[currency.id] = currency
+                snapshot.currencies_by_code[currency.code] = currency
+                snapshot.missing.pop(currency.code, None)
+                if currency.id is not None:
+                    snapshot.missing.pop(currency.id, None)
+                if currency.id is not None:
+                    snapshot.graph.add_currency(currency.id)
+                snapshot.version += 1
+                self._snapshot = snapshot
+
+    def put_rate(self, rate: Rate) -> None:
+        with self.lock:
+            # A write of the pair supersedes its pending update.
+            self.pending.pop((rate.base_id, rate.target_id), None)
+            self.acknowledged_at.pop((rate.base_id, rate.target_id), None)
+            snapshot = self._patchable_snapshot()
+            if snapshot is not None:
+                snapshot = snapshot.copy()
+                snapshot.rates[(rate.base_id, rate.target_id)] = rate
+                snapshot.graph.set_rate(rate)
+                snapshot.version += 1
+                self._snapshot = snapshot
+
+    def put_rates(self, rates: list[Rate]) -> None:
+        with self.lock:
+            for rate in rates:
+                self.pending.pop((rate.base_id, rate.target_id), None)
+                self.acknowledged_at.pop((rate.base_id, rate.target_id), None)
+            snapshot = self._patchable_snapshot()
+            if snapshot is not None:
+                snapshot = snapshot.copy()
+                for rate in rates:
+                    snapshot.rates[(rate.base_id, rate.target_id)] = rate
+                snapshot.graph.set_rates(rates)
+                snapshot.version += 1
+                self._snapshot = snapshot
+
+    def stage_rate(self, rate: Rate) -> None:
+        with self.lock:
+            self.pending[(rate.base_id, rate.target_id)] = rate
+            self.acknowledged_at[(rate.base_id, rate.target_id)] = time()
+            snapshot = self._snapshot
+            if snapshot is not None:
+                snapshot = snapshot.copy()
+                snapshot.rates[(rate.base_id, rate.target_id)] = rate
+                snapshot.graph.set_rate(rate)
+                self._snapshot = snapshot
+            self.generation += 1
+
+    def flush_pending(self, write: Callable[[list[tuple[Rate, float]]], int]) -> int:
+        # The lock is held through the write, so no reload can miss a rate
+        # that has left `pending` but is not committed yet. If the write fails,
+        # the rates stay pending. Returns how many rates were written.
+        with self.lock:
+            if not self.pending:
+                return 0
+            rates = [
+                (rate, self.acknowledged_at[pair])
+                for pair, rate in self.pending.items()
+            ]
+            written = write(rates)
+            self.pending.clear()
+            self.acknowledged_at.clear()
+            snapshot = self._patchable_snapshot()
+            if snapshot is not None and written < len(rates):
+                # Some pairs were written later by another process, so the
+                # snapshot has rates the database no longer holds.
+                self._snapshot = None
+            elif snapshot is not None:
+                snapshot = snapshot.copy()
+                snapshot.version += 1
+                self._snapshot = snapshot
+            return written
+
+    def _patchable_snapshot(self) -> RateBookSnapshot | None:
+        # Called right after a committed write: the snapshot can be patched only
+        # if that write is the sole change since it was loaded.
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version + 1 == data_version.version:
+            return snapshot
+        self._snapshot = None
+        return None
+
+    def _is_fresh(self, snapshot: RateBookSnapshot, version: int) -> bool:
+        return (
+            snapshot.version >= version
+            and not snapshot.stale
+            and monotonic() - snapshot.loaded_at <= self.ttl
+        )
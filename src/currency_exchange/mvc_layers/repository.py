@@ -1,23 +1,44 @@
 from decimal import Decimal
-from functools import cached_property
+from typing import NamedTuple
 
 from currency_exchange.models import Currency, Rate
-from currency_exchange.mvc_layers.daos import CurrencyDao, RateDao
+from currency_exchange.mvc_layers.daos import CurrencyDao, DataVersionDao, RateDao
+from currency_exchange.tracing import traced
+
+
+class RateWithCurrencies(NamedTuple):
+    rate: Rate
+    base_currency: Currency
+    target_currency: Currency
 
 
 class Repository:
+    def __init__(self) -> None:
+        self.data_version_dao = DataVersionDao()
+        self.currency_dao = CurrencyDao()
+        self.rate_dao = RateDao()
+
+    @traced('repository')
     def get_currencies(self) -> list[Currency]:
         query_result = self.currency_dao.retrieve_all()
         return [Currency(row[0], row[1], row[2], row[3]) for row in query_result]
 
+    @traced('repository')
+    def get_currencies_page(self, after_id: int, limit: int) -> list[Currency]:
+        query_result = self.currency_dao.retrieve_page(after_id, limit)
+        return [Currency(row[0], row[1], row[2], row[3]) for row in query_result]
+
+    @traced('repository')
     def get_currency(self, cur_code: str) -> Currency:
         query_result = self.currency_dao.retrieve_one_by_code(cur_code)
         return Currency(query_result[0], cur_code, query_result[1], query_result[2])
 
+    @traced('repository')
     def get_currency_by_id(self, cur_id: int) -> Currency:
         query_result = self.currency_dao.retrieve_one_by_id(cur_id)
         return Currency(cur_id, query_result[0], query_result[1], query_result[2])
 
+    @traced('repository')
     def create_currency(self, currency: Currency) -> Currency:
         query_result = self.currency_dao.create_one(
             currency.code, currency.full_name, currency.sign
@@ -25,10 +46,39 @@ class Repository:
         currency.id = query_result
         return currency
 
-    def get_rates(self) -> list[Rate]:
-        query_result = self.rate_dao.retrieve_all()
-        return [Rate(row[0], row[1], row[2], Decimal(row[3])) for row in query_result]
+    @traced('repository')
+    def get_rates_with_currencies(self) -> list[RateWithCurrencies]:
+        query_result = self.rate_dao.retrieve_all_with_currencies()
+        return [
+            RateWithCurrencies(
+                Rate(row[0], row[2], row[6], Decimal(row[1])),
+                Currency(row[2], row[3], row[4], row[5]),
+                Currency(row[6], row[7], row[8], row[9]),
+            )
+            for row in query_result
+        ]
+
+    @traced('repository')
+    def get_rates_page(
+        self,
+        after_id: int,
+        limit: int,
+        base_currency_id: int | None = None,
+        target_currency_id: int | None = None,
+    ) -> list[RateWithCurrencies]:
+        query_result = self.rate_dao.retrieve_page_with_currencies(
+            after_id, limit, base_currency_id, target_currency_id
+        )
+        return [
+            RateWithCurrencies(
+                Rate(row[0], row[2], row[6], Decimal(row[1])),
+                Currency(row[2], row[3], row[4], row[5]),
+                Currency(row[6], row[7], row[8], row[9]),
+            )
+            for row in query_result
+        ]
 
+    @traced('repository')
     def get_rate(self, base_currency_id: int, target_currency_id: int) -> Rate:
         query_result = self.rate_dao.retrieve_one(base_currency_id, target_currency_id)
         return Rate(
@@ -38,6 +88,21 @@ class Repository:
             Decimal(query_result[1]),
         )
 
+    @traced('repository')
+    def get_rate_at(
+        self, base_currency_id: int, target_currency_id: int, at: float
+    ) -> Rate:
+        query_result = self.rate_dao.retrieve_one_at(
+            base_currency_id, target_currency_id, at
+        )
+        return Rate(
+            query_result[0],
+            base_currency_id,
+            target_currency_id,
+            Decimal(query_result[1]),
+        )
+
+    @traced('repository')
     def create_rate(self, rate: Rate) -> Rate:
         query_result = self.rate_dao.create_one(
             rate.base_id, rate.target_id, str(rate.rate)
@@ -45,6 +110,7 @@ class Repository:
         rate.id = query_result
         return rate
 
+    @traced('repository')
     def update_rate(self, rate: Rate) -> Rate:
         query_result = self.rate_dao.update_one(
             rate.base_id, rate.target_id, str(rate.rate)
@@ -52,10 +118,32 @@ class Repository:
         rate.id = query_result
         return rate
 
-    @cached_property
-    def currency_dao(self) -> CurrencyDao:
-        return CurrencyDao()
+    @traced('repository')
+    def update_rates(self, rates: list[tuple[Rate, float]]) -> int:
+        return self.rate_dao.update_many(
+            [
+                (str(rate.rate), acknowledged_at, rate.base_id, rate.target_id)
+                for rate, acknowledged_at in rates
+            ]
+        )
+
+    @traced('repository')
+    def upsert_rate(self, rate: Rate) -> Rate:
+        query_result = self.rate_dao.upsert_one(
+            rate.base_id, rate.target_id, str(rate.rate)
+        )
+        rate.id = query_result
+        return rate
+
+    @traced('repository')
+    def upsert_rates(self, rates: list[Rate]) -> set[tuple[int, int]]:
+        existing_pairs, ids = self.rate_dao.upsert_many(
+            [(rate.base_id, rate.target_id, str(rate.rate)) for rate in rates]
+        )
+        for rate in rates:
+            rate.id = ids[(rate.base_id, rate.target_id)]
+        return existing_pairs
 
-    @cached_property
-    def rate_dao(self) -> RateDao:
-        return RateDao()
+    @traced('repository')
+    def get_data_version(self) -> int:
+        return self.data_version_dao.retrieve_one()
@@ -0,0 +1,41 @@
+from threading import Lock
+from time import monotonic
+
+from currency_exchange.constants import RATE_BOOK_TTL
+
+
+class ResponseCache:
+    # Encoded response bodies of the GET endpoints, valid for a single data
+    # version and rate book generation. Every write publishes a new version,
+    # so the first store under it drops whatever was cached before. Entries
+    # also expire with the rate book TTL, after which edits made outside the
+    # DAOs become visible.
+    def __init__(self, ttl: float = RATE_BOOK_TTL) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        self._version: tuple[int, int] | None = None
+        self._bodies: dict[str, tuple[float, bytes]] = {}
+
+    def get(self, version: tuple[int, int], key: str) -> bytes | None:
+        with self._lock:
+            entry = self._bodies.get(key) if version == self._version else None
+            if entry is not None and monotonic() - entry[0] <= self.ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, version: tuple[int, int], key: str, body: bytes) -> None:
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._version = version
+                self._bodies = {}
+            if version == self._version:
+                self._bodies[key] = (monotonic(), body)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._version = None
+            self._bodies = {}
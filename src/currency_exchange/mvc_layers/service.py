@@ -1,10 +1,11 @@
-from functools import cached_property
-from typing import NamedTuple
+from decimal import Decimal
+from typing import Any, NamedTuple
 
 from currency_exchange.constants import EXCHANGE_RATE_HELPER_CUR_CODE
 from currency_exchange.dtos import (
     CurrencyDto,
     CurrencyPostDto,
+    ExchangeAllDto,
     ExchangeDto,
     ExchangePostDto,
     RateDto,
@@ -17,7 +18,11 @@ from currency_exchange.exceptions import (
     NoRateError,
 )
 from currency_exchange.models import Currency, Rate
+from currency_exchange.mvc_layers.conversion_graph import ONE, Term
+from currency_exchange.mvc_layers.rate_book import RateBook, RateBookSnapshot
 from currency_exchange.mvc_layers.repository import Repository
+from currency_exchange.mvc_layers.write_behind import RateWriter
+from currency_exchange.tracing import traced
 
 
 class CurrenciesInfo(NamedTuple):
@@ -27,30 +32,108 @@ class CurrenciesInfo(NamedTuple):
     currency_2_id: int
 
 
+class ExchangeQuote(NamedTuple):
+    from_currency: CurrencyDto
+    to_currency: CurrencyDto
+    rate: Decimal
+
+
+class ImportedRate(NamedTuple):
+    rate: Rate
+    created: bool
+
+
+class StoredRate(NamedTuple):
+    rate: RateDto
+    created: bool
+
+
+class Page(NamedTuple):
+    items: list[Any]
+    # The ID to pass as the cursor for the next page, None on the last one.
+    next_cursor: int | None
+
+
 class Service:
+    # Shared by every request of a process, so it keeps no per-request state:
+    # each method takes the current rate book snapshot once and passes it on.
+    def __init__(
+        self,
+        repository: Repository,
+        rate_book: RateBook,
+        writer: RateWriter | None = None,
+    ) -> None:
+        self.repository = repository
+        self.rate_book = rate_book
+        self.writer = writer
+
+    @traced('service')
     def get_currencies(self) -> list[CurrencyDto]:
-        currencies = self.repository.get_currencies()
+        currencies = self.rate_book.current().get_currencies()
         return [self._currency_to_dto(currency) for currency in currencies]
 
+    @traced('service')
+    def get_currencies_page(self, cursor: int, limit: int) -> Page:
+        # Pages are read from the database, so that a client can walk a large
+        # table without the server building the whole list. One extra row
+        # tells whether another page follows.
+        currencies = self.repository.get_currencies_page(cursor, limit + 1)
+        return self._page(
+            [self._currency_to_dto(currency) for currency in currencies], limit
+        )
+
+    @traced('service')
     def get_currency(self, cur_code: str) -> CurrencyDto:
-        currency = self.repository.get_currency(cur_code)
+        currency = self.rate_book.current().get_currency(cur_code)
         return self._currency_to_dto(currency)
 
+    @traced('service')
     def get_rates(self) -> list[RateDto]:
-        rates = self.repository.get_rates()
+        rates = self.rate_book.current().get_rates()
         return [
-            self._rate_to_dto(
-                rate,
-                self.repository.get_currency_by_id(rate.base_id),
-                self.repository.get_currency_by_id(rate.target_id),
-            )
-            for rate in rates
+            self._rate_to_dto(rate, base_currency, target_currency)
+            for rate, base_currency, target_currency in rates
         ]
 
-    def get_rate(self, code_pair: str) -> RateDto:
+    @traced('service')
+    def get_rates_page(
+        self,
+        cursor: int,
+        limit: int,
+        base_code: str | None = None,
+        target_code: str | None = None,
+    ) -> Page:
+        book = self.rate_book.current()
+        base_currency_id = (
+            None if base_code is None else book.get_currency(base_code).id
+        )
+        target_currency_id = (
+            None if target_code is None else book.get_currency(target_code).id
+        )
+        rates = self.repository.get_rates_page(
+            cursor, limit + 1, base_currency_id, target_currency_id
+        )
+        # Updates still waiting for the write-behind writer are newer than
+        # the stored rates.
+        pending = self.rate_book.pending
+        return self._page(
+            [
+                self._rate_to_dto(
+                    pending.get((rate.base_id, rate.target_id), rate),
+                    base_currency,
+                    target_currency,
+                )
+                for rate, base_currency, target_currency in rates
+            ],
+            limit,
+        )
+
+    @traced('service')
+    def get_rate(self, code_pair: str, at: float | None = None) -> RateDto:
+        book = self.rate_book.current()
         try:
             base_currency, target_currency, base_currency_id, target_currency_id = (
-                self._resolve_code_pair(code_pair[:3], code_pair[3:])
+                self._resolve_code_pair(book, code_pair[:3], code_pair[3:])
             )
         except NoCurrencyError:
             raise NoRateError(
@@ -58,17 +141,24 @@ class Service:
                 'или обе валюты'
             )
 
-        rate = self.repository.get_rate(base_currency_id, target_currency_id)
+        if at is None:
+            rate = book.get_rate(base_currency_id, target_currency_id)
+        else:
+            rate = self.repository.get_rate_at(base_currency_id, target_currency_id, at)
         return self._rate_to_dto(rate, base_currency, target_currency)
 
+    @traced('service')
     def create_currency(self, currency_post_dto: CurrencyPostDto) -> CurrencyDto:
         cur_code = currency_post_dto.code
         cur_name = currency_post_dto.name
         cur_sign = currency_post_dto.sign
         currency = Currency(None, cur_code, cur_name, cur_sign)
-        currency_with_id = self.repository.create_currency(currency)
+        with self.rate_book.lock:
+            currency_with_id = self.repository.create_currency(currency)
+            self.rate_book.put_currency(currency_with_id)
         return self._currency_to_dto(currency_with_id)
 
+    @traced('service')
     def create_rate(self, rate_post_dto: RatePostUpdateDto) -> RateDto:
         base_cur_code = rate_post_dto.base_currency_code
         target_cur_code = rate_post_dto.target_currency_code
@@ -76,7 +166,9 @@ class Service:
 
         try:
             base_currency, target_currency, base_currency_id, target_currency_id = (
-                self._resolve_code_pair(base_cur_code, target_cur_code)
+                self._resolve_code_pair(
+                    self.rate_book.current(), base_cur_code, target_cur_code
+                )
             )
         except NoCurrencyError:
             raise NoCurrencyPairError(
@@ -84,9 +176,12 @@ class Service:
             )
 
         exchange_rate = Rate(None, base_currency_id, target_currency_id, rate)
-        exchange_rate_with_id = self.repository.create_rate(exchange_rate)
+        with self.rate_book.lock:
+            exchange_rate_with_id = self.repository.create_rate(exchange_rate)
+            self.rate_book.put_rate(exchange_rate_with_id)
         return self._rate_to_dto(exchange_rate_with_id, base_currency, target_currency)
 
+    @traced('service')
     def update_rate(self, rate_update_dto: RatePostUpdateDto) -> RateDto:
         base_cur_code = rate_update_dto.base_currency_code
         target_cur_code = rate_update_dto.target_currency_code
@@ -94,7 +189,9 @@ class Service:
 
         try:
             base_currency, target_currency, base_currency_id, target_currency_id = (
-                self._resolve_code_pair(base_cur_code, target_cur_code)
+                self._resolve_code_pair(
+                    self.rate_book.current(), base_cur_code, target_cur_code
+                )
             )
         except NoCurrencyError:
             raise NoRateError(
@@ -103,17 +200,179 @@ class Service:
             )
 
         exchange_rate = Rate(None, base_currency_id, target_currency_id, rate)
-        exchange_rate_with_id = self.repository.update_rate(exchange_rate)
+        with self.rate_book.lock:
+            if self.writer is not None:
+                # With write-behind a pair the rate book knows is updated in
+                # memory only; the writer stores it later.
+                stored = self.rate_book.current().rates.get(
+                    (base_currency_id, target_currency_id)
+                )
+                if stored is not None:
+                    exchange_rate.id = stored.id
+                    self.writer.update(exchange_rate)
+                    return self._rate_to_dto(
+                        exchange_rate, base_currency, target_currency
+                    )
+            exchange_rate_with_id = self.repository.update_rate(exchange_rate)
+            self.rate_book.put_rate(exchange_rate_with_id)
         return self._rate_to_dto(exchange_rate_with_id, base_currency, target_currency)
 
-    def exchange_currencies(self, exchange_post_dto: ExchangePostDto) -> ExchangeDto:
+    @traced('service')
+    def put_rate(self, rate_put_dto: RatePostUpdateDto) -> StoredRate:
+        base_cur_code = rate_put_dto.base_currency_code
+        target_cur_code = rate_put_dto.target_currency_code
+        rate = rate_put_dto.rate
+
+        try:
+            base_currency, target_currency, base_currency_id, target_currency_id = (
+                self._resolve_code_pair(
+                    self.rate_book.current(), base_cur_code, target_cur_code
+                )
+            )
+        except NoCurrencyError:
+            raise NoCurrencyPairError(
+                'Одна (или обе) валюта из валютной пары не существует в БД'
+            )
+
+        # The upsert does not tell an insert from an update, the rate book
+        # does: under its lock it is current for every write made through the
+        # DAOs.
+        exchange_rate = Rate(None, base_currency_id, target_currency_id, rate)
+        with self.rate_book.lock:
+            created = (
+                base_currency_id,
+                target_currency_id,
+            ) not in self.rate_book.current().rates
+            exchange_rate_with_id = self.repository.upsert_rate(exchange_rate)
+            self.rate_book.put_rate(exchange_rate_with_id)
+        return StoredRate(
+            self._rate_to_dto(exchange_rate_with_id, base_currency, target_currency),
+            created,
+        )
+
+    @traced('service')
+    def import_rates(
+        self, rate_dtos: list[RatePostUpdateDto]
+    ) -> list[ImportedRate | NoCurrencyPairError]:
+        # Codes are resolved against a single read of the currency table and
+        # all rates are written in one transaction.
+        currency_ids = {
+            currency.code: currency.id for currency in self.repository.get_currencies()
+        }
+
+        results: list[Rate | NoCurrencyPairError] = []
+        valid_rates: list[Rate] = []
+        for dto in rate_dtos:
+            base_currency_id = currency_ids.get(dto.base_currency_code)
+            target_currency_id = currency_ids.get(dto.target_currency_code)
+            if base_currency_id is None or target_currency_id is None:
+                results.append(
+                    NoCurrencyPairError(
+                        'Одна (или обе) валюта из валютной пары не существует в БД'
+                    )
+                )
+            else:
+                rate = Rate(None, base_currency_id, target_currency_id, dto.rate)
+                results.append(rate)
+                valid_rates.append(rate)
+
+        existing_pairs: set[tuple[int, int]] = set()
+        if valid_rates:
+            with self.rate_book.lock:
+                existing_pairs = self.repository.upsert_rates(valid_rates)
+                self.rate_book.put_rates(valid_rates)
+
+        imported: list[ImportedRate | NoCurrencyPairError] = []
+        for result in results:
+            if isinstance(result, NoCurrencyPairError):
+                imported.append(result)
+            else:
+                pair = (result.base_id, result.target_id)
+                imported.append(ImportedRate(result, pair not in existing_pairs))
+                existing_pairs.add(pair)
+        return imported
+
+    @traced('service')
+    def exchange_currencies(
+        self, exchange_post_dto: ExchangePostDto, at: float | None = None
+    ) -> ExchangeDto:
         from_cur_code = exchange_post_dto.from_currency_code
         to_cur_code = exchange_post_dto.to_currency_code
         amount = exchange_post_dto.amount
 
+        from_currency, to_currency, rate = self._quote(
+            self.rate_book.current(), from_cur_code, to_cur_code, at
+        )
+        return ExchangeDto(from_currency, to_currency, rate, amount, amount * rate)
+
+    @traced('service')
+    def exchange_to_all(self, exchange_all_dto: ExchangeAllDto) -> list[ExchangeDto]:
+        from_cur_code = exchange_all_dto.from_currency_code
+        amount = exchange_all_dto.amount
+
+        book = self.rate_book.current()
+        try:
+            from_currency = book.get_currency(from_cur_code)
+        except NoCurrencyError:
+            raise CantConvertError(
+                'Расчёт перевода невозможен, так как исходная валюта не найдена'
+            )
+
+        if from_currency.id is not None:
+            from_currency_id = from_currency.id
+        from_currency_dto = self._currency_to_dto(from_currency)
+        return [
+            ExchangeDto(
+                from_currency_dto,
+                self._currency_to_dto(to_currency),
+                rate,
+                amount,
+                amount * rate,
+            )
+            for to_currency, rate in book.get_cross_rates(from_currency_id)
+        ]
+
+    @traced('service')
+    def exchange_batch(
+        self, exchange_post_dtos: list[ExchangePostDto]
+    ) -> list[ExchangeDto | CantConvertError]:
+        book = self.rate_book.current()
+        quotes: dict[tuple[str, str], ExchangeQuote | CantConvertError] = {}
+        for code_pair in {
+            (dto.from_currency_code, dto.to_currency_code) for dto in exchange_post_dtos
+        }:
+            try:
+                quotes[code_pair] = self._quote(book, *code_pair)
+            except CantConvertError as error:
+                quotes[code_pair] = error
+
+        results: list[ExchangeDto | CantConvertError] = []
+        for dto in exchange_post_dtos:
+            quote = quotes[(dto.from_currency_code, dto.to_currency_code)]
+            if isinstance(quote, CantConvertError):
+                results.append(quote)
+            else:
+                results.append(
+                    ExchangeDto(
+                        quote.from_currency,
+                        quote.to_currency,
+                        quote.rate,
+                        dto.amount,
+                        dto.amount * quote.rate,
+                    )
+                )
+        return results
+
+    def _quote(
+        self,
+        book: RateBookSnapshot,
+        from_cur_code: str,
+        to_cur_code: str,
+        at: float | None = None,
+    ) -> ExchangeQuote:
         try:
             from_currency, to_currency, from_currency_id, to_currency_id = (
-                self._resolve_code_pair(from_cur_code, to_cur_code)
+                self._resolve_code_pair(book, from_cur_code, to_cur_code)
             )
         except NoCurrencyError:
             raise CantConvertError(
@@ -121,59 +380,63 @@ class Service:
             )
 
         try:
-            exchange_rate = self.repository.get_rate(from_currency_id, to_currency_id)
-            rate = exchange_rate.rate
-        except NoRateError:
-            try:
-                reversed_exchange_rate = self.repository.get_rate(
-                    to_currency_id, from_currency_id
+            if at is None:
+                rate = book.get_cross_rate(from_currency_id, to_currency_id)
+            else:
+                rate = self._get_cross_rate_at(
+                    book, from_currency_id, to_currency_id, at
                 )
-                rate = 1 / reversed_exchange_rate.rate
-            except NoRateError:
-                try:
-                    usd_currency = self.repository.get_currency(
-                        EXCHANGE_RATE_HELPER_CUR_CODE
-                    )
-                except NoCurrencyError:
-                    raise CantConvertError(
-                        'Расчёт перевода невозможен, так как отсутствует '
-                        'вспомогательная валюта, необходимая для вычисления '
-                        'обменного курса'
-                    )
-                if usd_currency.id is not None:
-                    usd_currency_id = usd_currency.id
-
-                try:
-                    rate_usd_from = self.repository.get_rate(
-                        usd_currency_id, from_currency_id
-                    )
-                    rate_usd_to = self.repository.get_rate(
-                        usd_currency_id, to_currency_id
-                    )
-                    rate = rate_usd_to.rate / rate_usd_from.rate
-                except NoRateError:
-                    raise CantConvertError(
-                        'Расчёт перевода невозможен, так как отсутствуют '
-                        'данные для вычисления обменного курса'
-                    )
+        except NoRateError:
+            raise CantConvertError(
+                'Расчёт перевода невозможен, так как отсутствуют '
+                'данные для вычисления обменного курса'
+            )
 
-        return ExchangeDto(
+        return ExchangeQuote(
             self._currency_to_dto(from_currency),
             self._currency_to_dto(to_currency),
             rate,
-            amount,
-            amount * rate,
         )
 
-    @cached_property
-    def repository(self) -> Repository:
-        return Repository()
+    def _get_cross_rate_at(
+        self, book: RateBookSnapshot, from_id: int, to_id: int, at: float
+    ) -> Decimal:
+        # The rate graph only knows current rates, so a past rate is looked up
+        # in the history as a direct or inverse quote, or as a cross rate
+        # through the hub currency: at most four index seeks.
+        try:
+            numerator, denominator = self._get_term_at(from_id, to_id, at)
+        except NoRateError:
+            try:
+                hub = book.get_currency(EXCHANGE_RATE_HELPER_CUR_CODE)
+            except NoCurrencyError:
+                raise NoRateError(
+                    'Обменный курс для пары на указанный момент не найден'
+                )
+            if hub.id is None or hub.id in (from_id, to_id):
+                raise
+            from_hub = self._get_term_at(from_id, hub.id, at)
+            hub_to = self._get_term_at(hub.id, to_id, at)
+            numerator = from_hub[0] * hub_to[0]
+            denominator = from_hub[1] * hub_to[1]
+        return numerator / denominator
+
+    def _get_term_at(self, from_id: int, to_id: int, at: float) -> Term:
+        try:
+            return self.repository.get_rate_at(from_id, to_id, at).rate, ONE
+        except NoRateError:
+            return ONE, self.repository.get_rate_at(to_id, from_id, at).rate
 
     def _currency_to_dto(self, currency: Currency) -> CurrencyDto:
         if currency.id is not None:
             id = currency.id
         return CurrencyDto(id, currency.full_name, currency.code, currency.sign)
 
+    def _page(self, items: list[CurrencyDto] | list[RateDto], limit: int) -> Page:
+        if len(items) > limit:
+            return Page(items[:limit], items[limit - 1].id)
+        return Page(items, None)
+
     def _rate_to_dto(
         self,
         rate: Rate,
@@ -189,14 +452,16 @@ class Service:
             rate.rate,
         )
 
+    @traced('resolve')
     def _resolve_code_pair(
         self,
+        book: RateBookSnapshot,
         code_a: str,
         code_b: str,
     ) -> CurrenciesInfo:
         try:
-            currency_a = self.repository.get_currency(code_a)
-            currency_b = self.repository.get_currency(code_b)
+            currency_a = book.get_currency(code_a)
+            currency_b = book.get_currency(code_b)
         except NoCurrencyError:
             raise
 
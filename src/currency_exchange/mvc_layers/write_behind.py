@@ -0,0 +1,89 @@
+import atexit
+from threading import Event, Lock, Thread
+
+from loguru import logger
+
+from currency_exchange.constants import DEFAULT_WRITE_BEHIND_MAX_PENDING
+from currency_exchange.exceptions import NoDataBaseConnectionError
+from currency_exchange.metrics import metrics
+from currency_exchange.models import Rate
+from currency_exchange.mvc_layers.rate_book import RateBook
+from currency_exchange.mvc_layers.repository import Repository
+
+
+class RateWriter:
+    # Write-behind for rate updates. update() only hands the rate to the rate
+    # book; a background thread writes whatever is pending in one transaction
+    # every `interval` seconds, or as soon as `max_pending` pairs wait. A pair
+    # updated several times in between is written once, with its last rate.
+    # An acknowledged update is lost if the process dies before the flush, so
+    # `interval` is also the durability window. Every process (a prefork
+    # worker, an app server worker) keeps its own queue and starts its own
+    # thread on first use. The flush skips a pair written after the update was
+    # acknowledged, so across processes the last acknowledged rate is stored.
+    def __init__(
+        self,
+        repository: Repository,
+        rate_book: RateBook,
+        interval: float,
+        max_pending: int = DEFAULT_WRITE_BEHIND_MAX_PENDING,
+    ) -> None:
+        self.repository = repository
+        self.rate_book = rate_book
+        self.interval = interval
+        self.max_pending = max_pending
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._stopping = False
+        self._thread: Thread | None = None
+        # App servers give no shutdown hook to WSGI applications.
+        atexit.register(self.stop)
+
+    def update(self, rate: Rate) -> None:
+        self.rate_book.stage_rate(rate)
+        if self._stopping:
+            self.flush()
+            return
+        self._ensure_running()
+        if len(self.rate_book.pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        try:
+            flushed = self.rate_book.flush_pending(self.repository.update_rates)
+        except NoDataBaseConnectionError as error:
+            logger.error(
+                f'Write-behind flush failed, {len(self.rate_book.pending)} '
+                f'rates stay pending: {error}'
+            )
+            return
+        if flushed:
+            metrics.inc('write_behind_flushes_total')
+            metrics.inc('write_behind_flushed_rates_total', amount=flushed)
+
+    def stop(self) -> None:
+        # Writes out what is pending; later updates are written at once.
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None and thread.is_alive():
+            thread.join()
+        self.flush()
+
+    def _ensure_running(self) -> None:
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            return
+        with self._lock:
+            # A thread inherited through fork is not alive in the child.
+            if self._stopping or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = Thread(target=self._run, name='rate-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
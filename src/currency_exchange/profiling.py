@@ -0,0 +1,172 @@
+import os
+import re
+from collections import Counter
+from cProfile import Profile
+from email.message import Message
+from hmac import compare_digest
+from itertools import count
+from pathlib import Path
+from random import random
+from sys import setprofile
+from threading import Lock
+from time import monotonic, perf_counter_ns, strftime
+from types import FrameType
+from typing import Any
+
+from loguru import logger
+
+from currency_exchange.constants import (
+    DEFAULT_PROFILE_DIR,
+    ENV_PROFILE_DIR,
+    ENV_PROFILE_FORMAT,
+    ENV_PROFILE_PER_MINUTE,
+    ENV_PROFILE_TOKEN,
+)
+from currency_exchange.settings import env_setting, non_negative_int
+
+PSTATS = 'pstats'
+COLLAPSED = 'collapsed'
+PROFILE_FORMATS = (PSTATS, COLLAPSED)
+
+
+class StackProfiler:
+    # Self time of every call stack of the current thread, in microseconds,
+    # written as collapsed stacks ("a;b;c 42" lines) that flamegraph.pl and
+    # speedscope read. It hooks sys.setprofile, so unlike a sampler it sees
+    # even the sub-millisecond calls of a single request.
+    def __init__(self) -> None:
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.path: tuple[str, ...] = ()
+        self.last = 0
+
+    def enable(self) -> None:
+        self.last = perf_counter_ns()
+        setprofile(self._profile)
+
+    def disable(self) -> None:
+        setprofile(None)
+
+    def _profile(self, frame: FrameType, event: str, arg: Any) -> None:
+        now = perf_counter_ns()
+        if self.path:
+            self.stacks[self.path] += now - self.last
+        if event == 'call':
+            code = frame.f_code
+            self.path += (f'{code.co_qualname} ({Path(code.co_filename).name})',)
+        elif event == 'c_call':
+            self.path += (getattr(arg, '__qualname__', repr(arg)),)
+        elif self.path:
+            self.path = self.path[:-1]
+        self.last = perf_counter_ns()
+
+    def dump(self, path: Path) -> None:
+        with path.open('w', encoding='utf-8') as file:
+            for stack, duration in self.stacks.items():
+                if duration >= 1000:
+                    file.write(f'{";".join(stack)} {duration // 1000}\n')
+
+
+class RandomSchedule:
+    # Spreads `per_minute` moments at random over every minute; the first
+    # request after each moment is profiled. Requests in between only compare
+    # the clock with the next moment.
+    def __init__(self, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self._lock = Lock()
+        self._moments: list[float] = []
+        self._window_end = 0.0
+        self._next = 0.0 if per_minute > 0 else float('inf')
+
+    def take(self) -> bool:
+        now = monotonic()
+        if now < self._next:
+            return False
+        with self._lock:
+            if now >= self._window_end:
+                self._window_end = now + 60
+                self._moments = sorted(
+                    now + random() * 60 for _ in range(self.per_minute)
+                )
+            taken = bool(self._moments) and now >= self._moments[0]
+            if taken:
+                self._moments.pop(0)
+            self._next = self._moments[0] if self._moments else self._window_end
+            return taken
+
+
+class RequestProfiler:
+    # Profiles a request when its X-Profile-Token header matches `token`
+    # (X-Profile-Format picks pstats or collapsed) and, process-wide,
+    # `per_minute` random requests. The output goes to `directory`, one file
+    # per request, and the response names it in an X-Profile header.
+    def __init__(
+        self,
+        token: str | None = None,
+        directory: Path = DEFAULT_PROFILE_DIR,
+        default_format: str = PSTATS,
+        per_minute: int = 0,
+    ) -> None:
+        if default_format not in PROFILE_FORMATS:
+            raise ValueError(f'Unknown profile format {default_format!r}')
+        self.token = token
+        self.directory = directory
+        self.default_format = default_format
+        self.schedule = RandomSchedule(per_minute)
+        self._numbers = count(1)
+
+    def start(self, headers: Message) -> Profile | StackProfiler | None:
+        output_format = self._requested_format(headers)
+        if output_format is None:
+            return None
+        profile = Profile() if output_format == PSTATS else StackProfiler()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this thread.
+            return None
+        return profile
+
+    def finish(self, profile: Profile | StackProfiler, method: str, route: str) -> str:
+        profile.disable()
+        extension = PSTATS if isinstance(profile, Profile) else COLLAPSED
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        name = (
+            f'{strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{next(self._numbers)}'
+            f'-{method}-{slug}.{extension}'
+        )
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            if isinstance(profile, Profile):
+                profile.dump_stats(self.directory / name)
+            else:
+                profile.dump(self.directory / name)
+        except OSError as error:
+            logger.error(f'Не удалось сохранить профиль запроса: {error!s}')
+        return name
+
+    def _requested_format(self, headers: Message) -> str | None:
+        if self.token is not None:
+            token = headers.get('X-Profile-Token')
+            if token is not None and compare_digest(
+                token.encode(), self.token.encode()
+            ):
+                output_format = headers.get('X-Profile-Format', self.default_format)
+                return output_format if output_format in PROFILE_FORMATS else None
+        if self.schedule.take():
+            return self.default_format
+        return None
+
+
+def profile_format(value: str) -> str:
+    if value not in PROFILE_FORMATS:
+        raise ValueError(value)
+    return value
+
+
+def profiler_from_env() -> RequestProfiler:
+    return RequestProfiler(
+        os.environ.get(ENV_PROFILE_TOKEN) or None,
+        Path(os.environ.get(ENV_PROFILE_DIR, DEFAULT_PROFILE_DIR)),
+        env_setting(ENV_PROFILE_FORMAT, PSTATS, profile_format),
+        env_setting(ENV_PROFILE_PER_MINUTE, 0, non_negative_int),
+    )
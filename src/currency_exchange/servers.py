@@ -0,0 +1,281 @@
+import os
+import signal
+import socket
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from select import select
+from socketserver import BaseServer, TCPServer, ThreadingMixIn
+from threading import BoundedSemaphore
+from types import FrameType
+from typing import Any
+
+from loguru import logger
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import (
+    DEFAULT_THREADED_WORKERS,
+    KEEP_ALIVE_TIMEOUT,
+    MAX_KEEP_ALIVE_REQUESTS,
+    REQUEST_QUEUE_SIZE,
+)
+from currency_exchange.mvc_layers.controller import (
+    Controller,
+    Request,
+    Response,
+    error_response,
+)
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+    def __init__(
+        self,
+        server_address: tuple[str, int],
+        handler_class: Callable[..., BaseHTTPRequestHandler],
+        max_workers: int = DEFAULT_THREADED_WORKERS,
+        bind_and_activate: bool = True,
+    ) -> None:
+        # Set up before binding: a failed bind calls server_close().
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='http-worker'
+        )
+        # Accepting stops while every worker is busy, so the excess connections
+        # wait in the listen backlog instead of piling up in the executor queue.
+        self.slots = BoundedSemaphore(max_workers)
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    def process_request(
+        self, request: Any, client_address: tuple[str, int] | Any
+    ) -> None:
+        self.slots.acquire()
+        try:
+            self.executor.submit(self.process_request_thread, request, client_address)
+        except RuntimeError:
+            self.slots.release()
+            self.shutdown_request(request)
+
+    def process_request_thread(
+        self, request: Any, client_address: tuple[str, int] | Any
+    ) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ReusePortHTTPServer(HTTPServer):
+    allow_reuse_port = True
+    request_queue_size = REQUEST_QUEUE_SIZE
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEP_ALIVE_TIMEOUT
+    disable_nagle_algorithm = True
+
+    request_body: bytes
+
+    def __init__(
+        self,
+        request: Any,
+        client_address: tuple[str, int] | Any,
+        server: BaseServer,
+        context: AppContext,
+    ) -> None:
+        # Servers get the handler bound to the context with functools.partial;
+        # the base class handles the request right in its __init__.
+        self.context = context
+        super().__init__(request, client_address, server)
+
+    def setup(self) -> None:
+        super().setup()
+        self.handled_requests = 0
+
+    def handle(self) -> None:
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection and self.wait_for_next_request():
+            self.handle_one_request()
+
+    def wait_for_next_request(self) -> bool:
+        # A pipelined request may already sit in the read buffer.
+        self.connection.settimeout(0)
+        try:
+            if self.rfile.peek(1):  # type: ignore[attr-defined]
+                return True
+        finally:
+            self.connection.settimeout(self.timeout)
+
+        # A serial server accepts no one while it waits on an idle client, so
+        # there the connection is given up as soon as another one is pending.
+        waiting_on = [self.connection]
+        if isinstance(self.server, TCPServer) and not isinstance(
+            self.server, (ThreadPoolHTTPServer, ThreadingMixIn)
+        ):
+            waiting_on.append(self.server.socket)
+        readable, _, _ = select(waiting_on, [], [], self.timeout)
+        return self.connection in readable
+
+    def parse_request(self) -> bool:
+        self.handled_requests += 1
+        self.request_body = b''
+
+        if not super().parse_request():
+            self.close_connection = True
+            return False
+
+        # The body is always read in full, even when no handler needs it, so
+        # that the next request on the connection starts at its request line.
+        error = framing_error(self.headers)
+        if error is not None:
+            self.close_connection = True
+            self.send_app_response(error)
+            return False
+        self.request_body = self.rfile.read(content_length(self.headers))
+        return True
+
+    def end_headers(self) -> None:
+        # Whatever closes the connection (the request limit, a framing or
+        # parse error, the client's own Connection: close) is announced, so
+        # that a keep-alive client does not send its next request into it.
+        if self.close_connection or self.handled_requests >= MAX_KEEP_ALIVE_REQUESTS:
+            self.send_header('Connection', 'close')
+        elif self.request_version == 'HTTP/1.0':
+            self.send_header('Connection', 'keep-alive')
+        super().end_headers()
+
+    def dispatch(self) -> None:
+        request = Request(self.command, self.path, self.headers, self.request_body)
+        self.send_app_response(Controller(request, self.context).handle())
+
+    do_GET = do_POST = do_PATCH = do_PUT = dispatch
+
+    def send_error(
+        self, code: int, message: str | None = None, explain: str | None = None
+    ) -> None:
+        # Called by the base class for requests it cannot parse, after which
+        # it closes the connection, as the original send_error announces.
+        self.close_connection = True
+        self.send_app_response(error_response(code, message, self.command == 'HEAD'))
+
+    def send_app_response(self, response: Response) -> None:
+        if response.error is not None:
+            self.log_error('code %d, message %s', response.status, response.error)
+        self.send_response(response.status)
+        for keyword, value in response.headers:
+            self.send_header(keyword, value)
+        self.end_headers()
+        if response.body:
+            self.wfile.write(response.body)
+
+
+class PreforkSupervisor:
+    def __init__(
+        self,
+        server_address: tuple[str, int],
+        handler_class: Callable[..., BaseHTTPRequestHandler],
+        workers: int,
+        on_close: Callable[[], None] | None = None,
+    ) -> None:
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError('SO_REUSEPORT is not supported on this platform')
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self.workers = workers
+        self.on_close = on_close
+        self.children: set[int] = set()
+        self.stopping = False
+
+    def run(self) -> None:
+        # Fail fast on a busy or forbidden address instead of respawning
+        # workers that can never bind.
+        ReusePortHTTPServer(self.server_address, self.handler_class).server_close()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+            while self.children:
+                pid, status = os.wait()
+                self.children.discard(pid)
+                if not self.stopping:
+                    logger.warning(f'Worker {pid} exited ({status}), respawning')
+                    self._spawn()
+        except KeyboardInterrupt:
+            self._stop()
+            while self.children:
+                pid, _ = os.wait()
+                self.children.discard(pid)
+
+    def _spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                signal.signal(signal.SIGTERM, _interrupt)
+                signal.signal(signal.SIGINT, _interrupt)
+                serve(
+                    ReusePortHTTPServer(self.server_address, self.handler_class),
+                    self.on_close,
+                )
+            except BaseException:
+                logger.exception('Worker crashed')
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self.children.add(pid)
+
+    def _stop(self, signum: int | None = None, frame: FrameType | None = None) -> None:
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def framing_error(headers: Message) -> Response | None:
+    if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+        return error_response(
+            HTTPStatus.LENGTH_REQUIRED,
+            'Тело запроса должно передаваться с заголовком Content-Length',
+        )
+    if not headers.get('Content-Length', '0').strip().isdigit():
+        return error_response(
+            HTTPStatus.BAD_REQUEST, 'Некорректный заголовок Content-Length'
+        )
+    return None
+
+
+def content_length(headers: Message) -> int:
+    return int(headers.get('Content-Length', '0'))
+
+
+def serve(httpd: HTTPServer, on_close: Callable[[], None] | None = None) -> None:
+    with httpd:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    if on_close is not None:
+        on_close()
+
+
+def _interrupt(_signum: int, _frame: FrameType | None) -> None:
+    # A second signal (Ctrl-C reaches the whole group, then the supervisor
+    # forwards SIGTERM) must not cut short the shutdown flush.
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise KeyboardInterrupt
@@ -0,0 +1,33 @@
+import os
+from collections.abc import Callable
+from typing import TypeVar
+
+from currency_exchange.exceptions import ConfigurationError
+
+T = TypeVar('T')
+
+
+def env_setting(name: str, default: T, convert: Callable[[str], T]) -> T:
+    # Settings are read when the objects using them are built at startup, not
+    # on import, and a bad value stops the startup with the variable named.
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        raise ConfigurationError(f'invalid {name} value: {value!r}') from None
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise ValueError(value)
+    return number
+
+
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
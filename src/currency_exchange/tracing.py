@@ -0,0 +1,142 @@
+import json
+import os
+from collections.abc import Callable
+from contextlib import AbstractContextManager, nullcontext
+from contextvars import ContextVar, Token
+from functools import wraps
+from random import random
+from time import perf_counter
+from types import TracebackType
+from typing import ParamSpec, TypeVar
+
+from loguru import logger
+
+from currency_exchange.constants import ENV_TRACE_LOG, ENV_TRACE_SAMPLE_RATE
+from currency_exchange.settings import env_setting
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+
+class Trace:
+    # Spans of one request, summed by name: a layer entered several times
+    # (e.g. a DAO call per fallback) shows up once, with its count.
+    def __init__(self) -> None:
+        self.started = perf_counter()
+        self.spans: dict[str, list[float]] = {}
+        self.token: Token[Trace | None] | None = None
+
+    def add(self, name: str, duration: float) -> None:
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [duration, 1]
+        else:
+            span[0] += duration
+            span[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        entries = [
+            f'{name};dur={duration * 1000:.3f}'
+            + (f';desc="{count:.0f} calls"' if count > 1 else '')
+            for name, (duration, count) in self.spans.items()
+        ]
+        entries.append(f'total;dur={total * 1000:.3f}')
+        return ', '.join(entries)
+
+
+current_trace: ContextVar[Trace | None] = ContextVar('current_trace', default=None)
+
+
+class Span:
+    __slots__ = ('name', 'started', 'trace')
+
+    def __init__(self, name: str, trace: Trace) -> None:
+        self.name = name
+        self.trace = trace
+        self.started = 0.0
+
+    def __enter__(self) -> None:
+        self.started = perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.trace.add(self.name, perf_counter() - self.started)
+
+
+NO_SPAN = nullcontext()
+
+
+def span(name: str) -> AbstractContextManager[None]:
+    trace = current_trace.get()
+    return NO_SPAN if trace is None else Span(name, trace)
+
+
+def traced(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    # Outside a sampled request the wrapper costs one ContextVar lookup.
+    def decorator(function: Callable[P, R]) -> Callable[P, R]:
+        @wraps(function)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            trace = current_trace.get()
+            if trace is None:
+                return function(*args, **kwargs)
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                trace.add(name, perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+class Tracer:
+    # Samples requests at `sample_rate` (0 turns tracing off, 1 traces every
+    # request). A sampled response carries a Server-Timing header, and with
+    # `log` set the spans are also logged as one JSON line.
+    def __init__(self, sample_rate: float = 0.0, log: bool = False) -> None:
+        self.sample_rate = sample_rate
+        self.log = log
+
+    def start(self) -> Trace | None:
+        if self.sample_rate <= 0 or (
+            self.sample_rate < 1 and random() >= self.sample_rate
+        ):
+            return None
+        trace = Trace()
+        trace.token = current_trace.set(trace)
+        return trace
+
+    def finish(self, trace: Trace, fields: dict[str, str | int]) -> str:
+        if trace.token is not None:
+            current_trace.reset(trace.token)
+        total = perf_counter() - trace.started
+        if self.log:
+            record = {
+                **fields,
+                'total_ms': round(total * 1000, 3),
+                'spans': {
+                    name: {'ms': round(duration * 1000, 3), 'count': int(count)}
+                    for name, (duration, count) in trace.spans.items()
+                },
+            }
+            logger.info(f'trace {json.dumps(record)}')
+        return trace.server_timing(total)
+
+
+def sample_rate(value: str) -> float:
+    rate = float(value)
+    if not 0 <= rate <= 1:
+        raise ValueError(value)
+    return rate
+
+
+def tracer_from_env() -> Tracer:
+    return Tracer(
+        env_setting(ENV_TRACE_SAMPLE_RATE, 0.0, sample_rate),
+        os.environ.get(ENV_TRACE_LOG, '').lower() in ('1', 'true', 'yes'),
+    )
@@ -1,48 +1,124 @@
 import json
-from dataclasses import asdict
+from collections.abc import Callable
+from dataclasses import fields, is_dataclass
+from datetime import UTC, datetime
 from decimal import ROUND_HALF_UP, Decimal
-from typing import Any
+from json.encoder import encode_basestring
+from typing import Any, get_args, get_origin, get_type_hints
 
 from currency_exchange.constants import NUMBER_OF_DECIMAL_PLACES_FOR_JSON
 from currency_exchange.dtos import (
+    BatchItemErrorDto,
     CurrencyDto,
     ExchangeDto,
     RateDto,
+    RateImportDto,
 )
+from currency_exchange.tracing import traced
 
+Encoder = Callable[[Any], str]
 
+JSON_DECIMAL_QUANTUM = Decimal('1').scaleb(-NUMBER_OF_DECIMAL_PLACES_FOR_JSON)
+
+
+@traced('serialize')
 def serialize(
-    data: CurrencyDto | RateDto | ExchangeDto | list[CurrencyDto] | list[RateDto],
+    data: CurrencyDto
+    | RateDto
+    | ExchangeDto
+    | RateImportDto
+    | list[CurrencyDto]
+    | list[RateDto]
+    | list[ExchangeDto]
+    | list[ExchangeDto | BatchItemErrorDto],
 ) -> str:
-    if isinstance(data, (CurrencyDto, RateDto, ExchangeDto)):
-        return to_json(to_dict(data))
+    if isinstance(data, (CurrencyDto, RateDto, ExchangeDto, RateImportDto)):
+        return get_encoder(type(data))(data)
     else:
-        return to_json([to_dict(obj) for obj in data])
-
-
-def to_json(obj: dict[str, Any] | list[dict[str, Any]]) -> str:
-    return json.dumps(obj, ensure_ascii=False)
-
-
-def to_dict(dto_obj: CurrencyDto | RateDto | ExchangeDto) -> dict[str, Any]:
-    dict_obj = asdict(dto_obj)
-    for key, value in dict_obj.items():
-        if isinstance(value, Decimal):
-            rounded_value = round_decimal(value, NUMBER_OF_DECIMAL_PLACES_FOR_JSON)
-            dict_obj[key] = float(rounded_value)
-    converted_keys_dict_obj = convert_keys(dict_obj)
-    return converted_keys_dict_obj
+        return '[' + ', '.join([get_encoder(type(obj))(obj) for obj in data]) + ']'
+
+
+# Encoders write the same text as json.dumps(obj, ensure_ascii=False) of the
+# camelCase dict the DTO used to be converted to, with Decimals rounded and
+# turned into floats, but without building that dict for every object.
+_encoders: dict[type, Encoder] = {}
+
+
+def get_encoder(dto_class: type) -> Encoder:
+    encoder = _encoders.get(dto_class)
+    if encoder is None:
+        encoder = _encoders[dto_class] = make_dto_encoder(dto_class)
+    return encoder
+
+
+def make_dto_encoder(dto_class: type) -> Encoder:
+    type_hints = get_type_hints(dto_class)
+    members = [
+        (
+            encode_basestring(to_lower_camel_case(field.name))
+            if '_' in field.name
+            else encode_basestring(field.name),
+            field.name,
+            make_value_encoder(type_hints[field.name]),
+        )
+        for field in fields(dto_class)
+    ]
+
+    def encode(dto_obj: Any) -> str:
+        return (
+            '{'
+            + ', '.join(
+                [
+                    f'{key}: {encode_value(getattr(dto_obj, name))}'
+                    for key, name, encode_value in members
+                ]
+            )
+            + '}'
+        )
+
+    return encode
+
+
+def make_value_encoder(value_type: Any) -> Encoder:
+    if value_type is str:
+        return encode_basestring
+    if value_type is int:
+        return int.__repr__
+    if value_type is Decimal:
+        return encode_decimal
+    if isinstance(value_type, type) and is_dataclass(value_type):
+        return get_encoder(value_type)
+    if get_origin(value_type) is list:
+        encode_item = make_value_encoder(get_args(value_type)[0])
+        return lambda values: (
+            '[' + ', '.join([encode_item(value) for value in values]) + ']'
+        )
+    return encode_any
+
+
+def encode_decimal(value: Decimal) -> str:
+    return float.__repr__(
+        float(value.quantize(JSON_DECIMAL_QUANTUM, rounding=ROUND_HALF_UP))
+    )
+
+
+def encode_any(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
 
 
 def round_decimal(value_dec: Decimal, places: int) -> Decimal:
     return value_dec.quantize(Decimal('1').scaleb(-places), rounding=ROUND_HALF_UP)
 
 
-def convert_keys(original: dict[str, Any]) -> dict[str, Any]:
-    return {
-        (to_lower_camel_case(key) if '_' in key else key): value
-        for key, value in original.items()
-    }
+def to_timestamp(value: str) -> float:
+    # Unix seconds, or an ISO 8601 date and time, taken as UTC without an offset.
+    try:
+        return float(value)
+    except ValueError:
+        moment = datetime.fromisoformat(value)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=UTC)
+        return moment.timestamp()
 
 
 def to_lower_camel_case(snake_str: str) -> str:
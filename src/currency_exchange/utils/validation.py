@@ -1,5 +1,8 @@
+from math import isfinite
 from unicodedata import category
 
+from currency_exchange.utils.data_helpers import to_timestamp
+
 
 def is_valid_name(name: str) -> bool:
     return ''.join(name.split(' ')).isalpha() and name.isascii() and name[0].isupper()
@@ -23,3 +26,14 @@ def is_positive_number(value: str) -> bool:
         return float(value) > 0
     except ValueError:
         return False
+
+
+def is_int_in_range(value: str, low: int, high: int) -> bool:
+    return value.isascii() and value.isdigit() and low <= int(value) <= high
+
+
+def is_valid_timestamp(value: str) -> bool:
+    try:
+        return isfinite(to_timestamp(value))
+    except ValueError:
+        return False
@@ -0,0 +1,47 @@
+from collections.abc import Iterable
+from email.message import Message
+from urllib.parse import quote
+from wsgiref.types import StartResponse, WSGIEnvironment
+
+from loguru import logger
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.mvc_layers.controller import Controller, Request
+from currency_exchange.servers import content_length, framing_error
+
+# An app server imports this module once per worker process, or once before
+# forking them when it preloads the application.
+context = AppContext()
+context.warm_up()
+
+
+def application(
+    environ: WSGIEnvironment, start_response: StartResponse
+) -> Iterable[bytes]:
+    headers = Message()
+    for key, value in environ.items():
+        if key.startswith('HTTP_'):
+            headers[key[5:].replace('_', '-').title()] = value
+    for key, name in (
+        ('CONTENT_TYPE', 'Content-Type'),
+        ('CONTENT_LENGTH', 'Content-Length'),
+    ):
+        if environ.get(key):
+            headers[name] = environ[key]
+
+    response = framing_error(headers)
+    if response is None:
+        # PATH_INFO arrives percent-decoded; the controller expects the path
+        # as it was sent.
+        path = quote(environ.get('PATH_INFO', '/').encode('latin-1'))
+        if environ.get('QUERY_STRING'):
+            path = f'{path}?{environ["QUERY_STRING"]}'
+        body = environ['wsgi.input'].read(content_length(headers))
+
+        request = Request(environ['REQUEST_METHOD'], path, headers, body)
+        response = Controller(request, context, sync_version=True).handle()
+
+    if response.error is not None:
+        logger.info(f'code {response.status}, message {response.error}')
+    start_response(f'{response.status} {response.reason}', response.headers)
+    return [response.body]
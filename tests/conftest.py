@@ -0,0 +1,26 @@
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.db import create_db
+from currency_exchange.db.data_version import data_version
+from currency_exchange.db.pool import pool
+
+
+@pytest.fixture
+def context(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[AppContext]:
+    # The demo data in a database of its own; the data version published by
+    # an earlier test would make this one's rate book look stale. Warmed up
+    # like a server's, so the data version is known from the first request.
+    db_path = tmp_path / 'db.sqlite'
+    monkeypatch.setattr(create_db, 'DB_PATH', db_path)
+    create_db.create_db()
+    pool.close_all()
+    monkeypatch.setattr(pool, 'db_path', db_path)
+    monkeypatch.setattr(data_version._version, 'value', 0)
+    context = AppContext()
+    context.warm_up()
+    yield context
+    context.close()
@@ -0,0 +1,63 @@
+from email.message import Message
+from http import HTTPStatus
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.mvc_layers.controller import Controller, Request, Response
+
+
+def send(
+    context: AppContext,
+    method: str,
+    path: str,
+    if_none_match: str | None = None,
+    body: bytes = b'',
+) -> Response:
+    headers = Message()
+    if if_none_match is not None:
+        headers['If-None-Match'] = if_none_match
+    if body:
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    return Controller(Request(method, path, headers, body), context).handle()
+
+
+def etag(response: Response) -> str:
+    return dict(response.headers)['ETag']
+
+
+def test_matching_etag_is_not_modified(context: AppContext) -> None:
+    response = send(context, 'GET', '/currency/USD')
+    assert response.status == HTTPStatus.OK
+    assert 'Last-Modified' not in dict(response.headers)
+
+    revalidated = send(context, 'GET', '/currency/USD', etag(response))
+    assert revalidated.status == HTTPStatus.NOT_MODIFIED
+    assert revalidated.body == b''
+    assert etag(revalidated) == etag(response)
+
+    weak = send(context, 'GET', '/currency/USD', f'"x", W/{etag(response)}')
+    assert weak.status == HTTPStatus.NOT_MODIFIED
+
+
+def test_other_etag_gets_the_body(context: AppContext) -> None:
+    response = send(context, 'GET', '/currency/USD', '"no-such-version"')
+    assert response.status == HTTPStatus.OK
+    assert b'"USD"' in response.body
+
+
+def test_write_changes_the_etag(context: AppContext) -> None:
+    before = send(context, 'GET', '/exchangeRate/USDEUR')
+    update = send(context, 'PATCH', '/exchangeRate/USDEUR', body=b'rate=0.5')
+    assert update.status == HTTPStatus.OK
+
+    after = send(context, 'GET', '/exchangeRate/USDEUR', etag(before))
+    assert after.status == HTTPStatus.OK
+    assert etag(after) != etag(before)
+    assert b'0.5' in after.body
+
+
+def test_star_matches_only_an_existing_resource(context: AppContext) -> None:
+    assert send(context, 'GET', '/currency/USD', '*').status == HTTPStatus.NOT_MODIFIED
+    assert send(context, 'GET', '/currency/XYZ', '*').status == HTTPStatus.NOT_FOUND
+    assert (
+        send(context, 'GET', '/exchangeRate/USDXYZ', '*').status == HTTPStatus.NOT_FOUND
+    )
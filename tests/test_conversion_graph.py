@@ -0,0 +1,64 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from currency_exchange.models import Rate
+from currency_exchange.mvc_layers.conversion_graph import ConversionGraph
+
+HUB = 1
+
+
+def assert_same_graph(patched: ConversionGraph, rebuilt: ConversionGraph) -> None:
+    assert patched.ids == rebuilt.ids
+    assert patched.parents == rebuilt.parents
+    assert patched.matrix == rebuilt.matrix
+
+
+def test_set_rate_prefers_hub_path_of_equal_length() -> None:
+    # 2 reaches 4 through 3; a new 2-USD quote opens 2 -> USD -> 4, as short
+    # as the old path, and a rebuilt graph converts through the hub.
+    ids = [1, 2, 3, 4]
+    rates = [
+        Rate(1, 2, 3, Decimal(2)),
+        Rate(2, 3, 4, Decimal(3)),
+        Rate(3, 1, 4, Decimal(5)),
+    ]
+    graph = ConversionGraph(ids, rates, HUB)
+    assert graph.rate(2, 4) == Decimal(6)
+
+    new_rate = Rate(4, 2, 1, Decimal(7))
+    graph.set_rate(new_rate)
+
+    assert graph.rate(2, 4) == Decimal(35)
+    assert_same_graph(graph, ConversionGraph(ids, [*rates, new_rate], HUB))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_set_rate_matches_rebuilt_graph(seed: int) -> None:
+    generator = random.Random(seed)
+    ids = list(range(1, 13))
+    pairs = [(base, target) for base in ids for target in ids if base != target]
+    generator.shuffle(pairs)
+    rates = {
+        pair: Rate(number, *pair, Decimal(generator.randint(1, 999)) / 100)
+        for number, pair in enumerate(pairs[:8], 1)
+    }
+    graph = ConversionGraph(ids, list(rates.values()), HUB)
+
+    for number, pair in enumerate(pairs[8:40], 9):
+        rate = Rate(number, *pair, Decimal(generator.randint(1, 999)) / 100)
+        rates[pair] = rate
+        graph.set_rate(rate)
+        assert_same_graph(graph, ConversionGraph(ids, list(rates.values()), HUB))
+
+
+def test_copy_leaves_original_unchanged() -> None:
+    graph = ConversionGraph([1, 2, 3], [Rate(1, 1, 2, Decimal(2))], HUB)
+    patched = graph.copy()
+    patched.add_currency(4)
+    patched.set_rate(Rate(2, 3, 4, Decimal(3)))
+
+    assert graph.ids == [1, 2, 3]
+    assert graph.rate(3, 4) is None
+    assert patched.rate(3, 4) == Decimal(3)
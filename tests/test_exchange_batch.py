@@ -0,0 +1,50 @@
+import json
+from email.message import Message
+from http import HTTPStatus
+from typing import Any
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.mvc_layers.controller import Controller, Request
+
+
+def post_batch(context: AppContext, items: list[dict[str, Any]]) -> Any:
+    headers = Message()
+    headers['Content-Type'] = 'application/json'
+    request = Request('POST', '/exchange/batch', headers, json.dumps(items).encode())
+    response = Controller(request, context).handle()
+    assert response.status == HTTPStatus.OK
+    return json.loads(response.body)
+
+
+def test_bad_amounts_fail_only_their_items(context: AppContext) -> None:
+    results = post_batch(
+        context,
+        [
+            {'from': 'USD', 'to': 'EUR', 'amount': 'Infinity'},
+            {'from': 'USD', 'to': 'EUR', 'amount': 10},
+            {'from': 'USD', 'to': 'EUR', 'amount': '1e30'},
+            {'from': 'USD', 'to': 'EUR', 'amount': 'NaN'},
+        ],
+    )
+
+    assert [result.get('status') for result in results] == [
+        HTTPStatus.BAD_REQUEST,
+        None,
+        HTTPStatus.BAD_REQUEST,
+        HTTPStatus.BAD_REQUEST,
+    ]
+    assert results[1]['amount'] == 10
+
+
+def test_converted_amount_too_large_fails_only_its_item(context: AppContext) -> None:
+    # The amount itself rounds fine, its conversion into RUB does not.
+    results = post_batch(
+        context,
+        [
+            {'from': 'USD', 'to': 'RUB', 'amount': '1e25'},
+            {'from': 'USD', 'to': 'RUB', 'amount': 1},
+        ],
+    )
+
+    assert results[0]['status'] == HTTPStatus.BAD_REQUEST
+    assert results[1]['convertedAmount'] > 1
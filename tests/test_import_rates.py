@@ -0,0 +1,96 @@
+import json
+from email.message import Message
+from http import HTTPStatus
+from typing import Any
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.mvc_layers.controller import Controller, Request, Response
+
+
+def send(
+    context: AppContext, method: str, path: str, content_type: str, body: bytes
+) -> Response:
+    headers = Message()
+    headers['Content-Type'] = content_type
+    return Controller(Request(method, path, headers, body), context).handle()
+
+
+def get_rate(context: AppContext, pair: str) -> Any:
+    response = Controller(
+        Request('GET', f'/exchangeRate/{pair}', Message(), b''), context
+    ).handle()
+    assert response.status == HTTPStatus.OK
+    return json.loads(response.body)['rate']
+
+
+def test_csv_import_creates_updates_and_reports_bad_rows(context: AppContext) -> None:
+    created = send(
+        context,
+        'POST',
+        '/currencies',
+        'application/x-www-form-urlencoded',
+        b'name=Japanese+yen&code=JPY&sign=%C2%A5',
+    )
+    assert created.status == HTTPStatus.CREATED
+
+    response = send(
+        context,
+        'POST',
+        '/exchangeRates/bulk',
+        'text/csv',
+        b'baseCurrencyCode,targetCurrencyCode,rate\n'
+        b'JPY,USD,0.25\n'
+        b'USD,EUR,0.9\n'
+        b'XYZ,EUR,1\n'
+        b'USD,GBP,abc\n',
+    )
+
+    assert response.status == HTTPStatus.OK
+    result = json.loads(response.body)
+    assert (result['created'], result['updated'], result['failed']) == (1, 1, 2)
+    assert [item['status'] for item in result['items']] == [
+        HTTPStatus.CREATED,
+        HTTPStatus.OK,
+        HTTPStatus.NOT_FOUND,
+        HTTPStatus.BAD_REQUEST,
+    ]
+    assert [item['row'] for item in result['items']] == [1, 2, 3, 4]
+    assert get_rate(context, 'JPYUSD') == 0.25
+    assert get_rate(context, 'USDEUR') == 0.9
+    assert get_rate(context, 'USDGBP') == 0.74
+
+
+def test_json_import_takes_a_list_or_items(context: AppContext) -> None:
+    for body in (
+        [{'baseCurrencyCode': 'USD', 'targetCurrencyCode': 'EUR', 'rate': 0.8}],
+        {
+            'items': [
+                {'baseCurrencyCode': 'USD', 'targetCurrencyCode': 'EUR', 'rate': 0.7}
+            ]
+        },
+    ):
+        response = send(
+            context,
+            'POST',
+            '/exchangeRates/bulk',
+            'application/json',
+            json.dumps(body).encode(),
+        )
+        assert response.status == HTTPStatus.OK
+        assert json.loads(response.body)['updated'] == 1
+    assert get_rate(context, 'USDEUR') == 0.7
+
+
+def test_import_rejects_other_media_types_and_empty_bodies(
+    context: AppContext,
+) -> None:
+    body = b'USD,EUR,0.9\n'
+    assert (
+        send(context, 'POST', '/exchangeRates/bulk', 'text/plain', body).status
+        == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+    )
+    assert (
+        send(context, 'POST', '/exchangeRates/bulk', 'application/json', b'[]').status
+        == HTTPStatus.BAD_REQUEST
+    )
+    assert get_rate(context, 'USDEUR') == 0.85
@@ -0,0 +1,40 @@
+import sys
+
+import pytest
+
+from currency_exchange.constants import ENV_WORKERS, SERVER_MODE_PREFORK
+from currency_exchange.main import parse_args
+
+
+@pytest.mark.parametrize('workers', ['-2', '0', 'two'])
+def test_invalid_workers_option_is_rejected(
+    workers: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv(ENV_WORKERS, raising=False)
+    monkeypatch.setattr(
+        sys, 'argv', ['main', '--mode', 'prefork', '--workers', workers]
+    )
+    with pytest.raises(SystemExit) as exit_info:
+        parse_args()
+    assert exit_info.value.code == 2
+
+
+@pytest.mark.parametrize('workers', ['-2', '0', 'two'])
+def test_invalid_workers_variable_is_rejected(
+    workers: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv(ENV_WORKERS, workers)
+    monkeypatch.setattr(sys, 'argv', ['main', '--mode', 'prefork'])
+    with pytest.raises(SystemExit) as exit_info:
+        parse_args()
+    assert exit_info.value.code == 2
+
+
+def test_workers_from_option_and_variable(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv(ENV_WORKERS, '3')
+    monkeypatch.setattr(sys, 'argv', ['main', '--mode', 'prefork'])
+    args = parse_args()
+    assert (args.mode, args.workers) == (SERVER_MODE_PREFORK, 3)
+
+    monkeypatch.setattr(sys, 'argv', ['main', '--mode', 'prefork', '--workers', '2'])
+    assert parse_args().workers == 2
@@ -0,0 +1,54 @@
+from pathlib import Path
+from sqlite3 import connect
+
+from currency_exchange.constants import (
+    CREATE_CURRENCIES_TABLE_SQL,
+    CREATE_EXCHANGE_RATES_TABLE_SQL,
+    INSERT_INTO_CURRENCIES_SQL,
+    INSERT_INTO_EXCHANGE_RATES_SQL,
+)
+from currency_exchange.db.create_db import migrate_db
+from currency_exchange.db.pool import ConnectionPool
+
+
+def test_migrate_db_brings_an_old_database_up_to_date(tmp_path: Path) -> None:
+    # A database with only the tables of the first version.
+    db_path = tmp_path / 'db.sqlite'
+    with connect(db_path) as conn:
+        conn.execute(CREATE_CURRENCIES_TABLE_SQL)
+        conn.execute(CREATE_EXCHANGE_RATES_TABLE_SQL)
+        conn.executemany(
+            INSERT_INTO_CURRENCIES_SQL,
+            [('USD', 'US Dollar', '$'), ('EUR', 'Euro', '€')],
+        )
+        conn.execute(INSERT_INTO_EXCHANGE_RATES_SQL, (1, 2, '0.9'))
+    conn.close()
+
+    # Connections leave the schema alone.
+    pool = ConnectionPool(db_path)
+    pool.connection()
+    pool.close_all()
+    with connect(db_path) as conn:
+        tables = {row[0] for row in conn.execute('SELECT name FROM sqlite_master')}
+    conn.close()
+    assert 'DataVersion' not in tables
+    assert 'ExchangeRateHistory' not in tables
+
+    # Running it twice seeds the history once.
+    migrate_db(db_path)
+    migrate_db(db_path)
+    with connect(db_path) as conn:
+        names = {row[0] for row in conn.execute('SELECT name FROM sqlite_master')}
+        history = conn.execute(
+            'SELECT BaseCurrencyId, TargetCurrencyId, Rate FROM ExchangeRateHistory'
+        ).fetchall()
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(ExchangeRates)')}
+        conn.execute('UPDATE ExchangeRates SET Rate = 0.95')
+        history_count = conn.execute(
+            'SELECT COUNT(*) FROM ExchangeRateHistory'
+        ).fetchone()[0]
+    conn.close()
+    assert {'DataVersion', 'rates_base', 'rates_target'} <= names
+    assert 'UpdatedAt' in columns
+    assert history == [(1, 2, 0.9)]
+    assert history_count == 2
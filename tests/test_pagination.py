@@ -0,0 +1,61 @@
+import json
+from email.message import Message
+from http import HTTPStatus
+from typing import Any
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.mvc_layers.controller import Controller, Request, Response
+
+
+def get(context: AppContext, path: str) -> Response:
+    return Controller(Request('GET', path, Message()), context).handle()
+
+
+def follow_pages(context: AppContext, path: str) -> list[list[Any]]:
+    # Walks the Link headers from the first page to the last one.
+    pages = []
+    next_path: str | None = path
+    while next_path is not None:
+        response = get(context, next_path)
+        assert response.status == HTTPStatus.OK
+        pages.append(json.loads(response.body))
+        headers = dict(response.headers)
+        next_path = None
+        if 'Link' in headers:
+            next_path = headers['Link'].split('>')[0].removeprefix('<')
+            cursor = headers['X-Next-Cursor']
+            assert next_path.endswith(f'cursor={cursor}')
+    return pages
+
+
+def test_currency_pages_follow_the_next_links(context: AppContext) -> None:
+    pages = follow_pages(context, '/currencies?limit=2')
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    codes = [currency['code'] for page in pages for currency in page]
+    everything = json.loads(get(context, '/currencies').body)
+    assert codes == [currency['code'] for currency in everything]
+
+
+def test_rate_pages_keep_the_filter(context: AppContext) -> None:
+    pages = follow_pages(context, '/exchangeRates?base=USD&limit=3')
+
+    assert [len(page) for page in pages] == [3, 1]
+    assert {rate['baseCurrency']['code'] for page in pages for rate in page} == {'USD'}
+    assert {rate['targetCurrency']['code'] for page in pages for rate in page} == {
+        'EUR',
+        'GBP',
+        'RUB',
+        'THB',
+    }
+
+
+def test_bad_page_requests_are_rejected(context: AppContext) -> None:
+    for path in (
+        '/currencies?limit=0',
+        '/currencies?limit=abc',
+        '/exchangeRates?cursor=-1',
+        '/exchangeRates?base=usd',
+    ):
+        assert get(context, path).status == HTTPStatus.BAD_REQUEST
+    assert get(context, '/exchangeRates?base=XYZ').status == HTTPStatus.NOT_FOUND
@@ -0,0 +1,54 @@
+import json
+from email.message import Message
+from http import HTTPStatus
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.mvc_layers.controller import Controller, Request, Response
+
+
+def send(context: AppContext, method: str, path: str, body: bytes = b'') -> Response:
+    headers = Message()
+    headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    return Controller(Request(method, path, headers, body), context).handle()
+
+
+def test_put_creates_a_new_pair(context: AppContext) -> None:
+    created = send(
+        context, 'POST', '/currencies', b'name=Japanese+yen&code=JPY&sign=%C2%A5'
+    )
+    assert created.status == HTTPStatus.CREATED
+
+    response = send(context, 'PUT', '/exchangeRate/JPYUSD', b'rate=0.25')
+
+    assert response.status == HTTPStatus.CREATED
+    rate = json.loads(response.body)
+    assert rate['baseCurrency']['code'] == 'JPY'
+    assert rate['targetCurrency']['code'] == 'USD'
+    assert rate['rate'] == 0.25
+    stored = send(context, 'GET', '/exchangeRate/JPYUSD')
+    assert json.loads(stored.body)['id'] == rate['id']
+
+
+def test_put_updates_an_existing_pair_in_place(context: AppContext) -> None:
+    before = json.loads(send(context, 'GET', '/exchangeRate/USDEUR').body)
+
+    response = send(context, 'PUT', '/exchangeRate/USDEUR', b'rate=0.9')
+
+    assert response.status == HTTPStatus.OK
+    rate = json.loads(response.body)
+    assert (rate['id'], rate['rate']) == (before['id'], 0.9)
+    stored = json.loads(send(context, 'GET', '/exchangeRate/USDEUR').body)
+    assert stored['rate'] == 0.9
+
+
+def test_put_rejects_unknown_currencies_and_bad_rates(context: AppContext) -> None:
+    assert (
+        send(context, 'PUT', '/exchangeRate/USDXYZ', b'rate=1').status
+        == HTTPStatus.NOT_FOUND
+    )
+    for body in (b'rate=-1', b'rate=abc', b''):
+        assert (
+            send(context, 'PUT', '/exchangeRate/USDEUR', body).status
+            == HTTPStatus.BAD_REQUEST
+        )
+    assert json.loads(send(context, 'GET', '/exchangeRate/USDEUR').body)['rate'] == 0.85
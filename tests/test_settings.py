@@ -0,0 +1,45 @@
+import pytest
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import (
+    ENV_PROFILE_FORMAT,
+    ENV_PROFILE_PER_MINUTE,
+    ENV_TRACE_SAMPLE_RATE,
+    ENV_WRITE_BEHIND_MAX_PENDING,
+    ENV_WRITE_BEHIND_MS,
+)
+from currency_exchange.exceptions import ConfigurationError
+from currency_exchange.settings import env_setting, non_negative_int
+
+
+def test_env_setting_names_the_bad_variable(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv('CURRENCY_EXCHANGE_TEST', '-1')
+    with pytest.raises(ConfigurationError, match='CURRENCY_EXCHANGE_TEST'):
+        env_setting('CURRENCY_EXCHANGE_TEST', 0, non_negative_int)
+
+    monkeypatch.setenv('CURRENCY_EXCHANGE_TEST', '3')
+    assert env_setting('CURRENCY_EXCHANGE_TEST', 0, non_negative_int) == 3
+    monkeypatch.delenv('CURRENCY_EXCHANGE_TEST')
+    assert env_setting('CURRENCY_EXCHANGE_TEST', 0, non_negative_int) == 0
+
+
+@pytest.mark.parametrize(
+    ('name', 'value'),
+    [
+        (ENV_PROFILE_FORMAT, 'flame'),
+        (ENV_PROFILE_PER_MINUTE, 'often'),
+        (ENV_PROFILE_PER_MINUTE, '-1'),
+        (ENV_TRACE_SAMPLE_RATE, '2'),
+        (ENV_TRACE_SAMPLE_RATE, 'half'),
+        (ENV_WRITE_BEHIND_MS, '0.5'),
+        (ENV_WRITE_BEHIND_MS, '-200'),
+        (ENV_WRITE_BEHIND_MAX_PENDING, '0'),
+        (ENV_WRITE_BEHIND_MAX_PENDING, 'many'),
+    ],
+)
+def test_bad_settings_stop_the_context(
+    name: str, value: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv(name, value)
+    with pytest.raises(ConfigurationError, match=name):
+        AppContext()
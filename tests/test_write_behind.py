@@ -0,0 +1,82 @@
+import json
+import sqlite3
+from collections.abc import Iterator
+from decimal import Decimal
+from email.message import Message
+from http import HTTPStatus
+
+import pytest
+
+from currency_exchange.app_context import AppContext
+from currency_exchange.constants import ENV_WRITE_BEHIND_MS
+from currency_exchange.db.pool import pool
+from currency_exchange.mvc_layers.controller import Controller, Request
+
+
+@pytest.fixture
+def workers(
+    context: AppContext,  # noqa: ARG001 (for its database)
+    monkeypatch: pytest.MonkeyPatch,
+) -> Iterator[tuple[AppContext, AppContext]]:
+    # Two write-behind contexts over one database stand for two worker
+    # processes; the interval is long enough that only the tests flush.
+    monkeypatch.setenv(ENV_WRITE_BEHIND_MS, '600000')
+    first, second = AppContext(), AppContext()
+    yield first, second
+    first.close()
+    second.close()
+
+
+def send(context: AppContext, method: str, path: str, body: bytes) -> int:
+    headers = Message()
+    headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    request = Request(method, path, headers, body)
+    return Controller(request, context).handle().status
+
+
+def flush(context: AppContext) -> None:
+    assert context.writer is not None
+    context.writer.flush()
+
+
+def stored_rate(base: str, target: str) -> Decimal:
+    with sqlite3.connect(pool.db_path) as conn:
+        row = conn.execute(
+            'SELECT r.Rate FROM ExchangeRates AS r '
+            'JOIN Currencies AS b ON b.ID = r.BaseCurrencyId '
+            'JOIN Currencies AS t ON t.ID = r.TargetCurrencyId '
+            'WHERE b.Code = ? AND t.Code = ?',
+            (base, target),
+        ).fetchone()
+    conn.close()
+    return Decimal(str(row[0]))
+
+
+def test_last_acknowledged_update_wins_whoever_flushes_last(
+    workers: tuple[AppContext, AppContext],
+) -> None:
+    first, second = workers
+    assert send(first, 'PATCH', '/exchangeRate/USDEUR', b'rate=1') == HTTPStatus.OK
+    assert send(second, 'PATCH', '/exchangeRate/USDEUR', b'rate=2') == HTTPStatus.OK
+
+    flush(second)
+    flush(first)
+
+    assert stored_rate('USD', 'EUR') == 2
+
+
+def test_pending_update_does_not_overwrite_a_later_put(
+    workers: tuple[AppContext, AppContext],
+) -> None:
+    first, second = workers
+    assert send(first, 'PATCH', '/exchangeRate/USDEUR', b'rate=3') == HTTPStatus.OK
+    assert send(second, 'PUT', '/exchangeRate/USDEUR', b'rate=4') == HTTPStatus.OK
+
+    flush(first)
+
+    assert stored_rate('USD', 'EUR') == 4
+    # The worker whose update lost reads the stored rate again.
+    response = Controller(
+        Request('GET', '/exchangeRate/USDEUR', Message(), b''), first
+    ).handle()
+    assert json.loads(response.body)['rate'] == 4